@@ -0,0 +1,341 @@
+"""Двухуровневый кэш: память процесса перед общим кэшем.
+
+`TwoTierCache` хранит последние прочитанные значения в ограниченном
+LRU-кэше процесса (L1), а за остальными обращается к общему для всех
+процессов кэшу (L2) из `CACHES` с именем из параметра `SHARED`.
+Запись идет в оба уровня.
+
+Чтобы изменение в одном процессе дошло до L1 остальных, ключи каждой
+записи и удаления заносятся в журнал в L2: счетчик записей и записи
+журнала с ключами. Не чаще раза в `SYNC_INTERVAL` секунд процесс
+дочитывает журнал и вытесняет из L1 измененные ключи, а если журнал
+успел устареть или кэш очищен — весь L1. Значение живет в L1 не
+дольше `LOCAL_TIMEOUT` секунд, это ограничивает расхождение, если
+запись журнала потерялась.
+
+`add` и `incr` передаются в L2 как есть: на них держатся номера записей
+журнала и блокировки `core.caching`, поэтому L2 должен выполнять их
+атомарно для всех процессов. У `FileBasedCache` в Django 2.2 они не
+атомарны (проверка и запись отдельно), и общий кэш в файлах задается
+`LockedFileBasedCache` — он выполняет их под блокировкой файла.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': 'yatube',
+            'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 1000},
+        },
+        'shared': {
+            'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+            'LOCATION': '/var/tmp/yatube_cache',
+        },
+    }
+"""
+
+import fcntl
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+SEQUENCE_KEY = '{channel}:log:sequence'
+EPOCH_KEY = '{channel}:log:epoch'
+ENTRY_KEY = '{channel}:log:{number}'
+# Пропустив больше записей журнала, процесс очищает L1 целиком
+MAX_REPLAY = 1000
+
+_missing = object()
+# Память процесса по LOCATION: общая для потоков, как у LocMemCache
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class _LocalTier:
+    """LRU-кэш процесса и его положение в журнале."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.epoch = None
+        self.sequence = None
+        self.next_sync = 0
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        self._log_timeout = options.get('LOG_TIMEOUT', 300)
+        self._channel = location or 'two-tier'
+        self._sequence_key = SEQUENCE_KEY.format(channel=self._channel)
+        self._epoch_key = EPOCH_KEY.format(channel=self._channel)
+        with _tiers_lock:
+            self._tier = _tiers.setdefault(self._channel, _LocalTier())
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self._shared_alias]
+
+    def stats(self) -> dict:
+        """Счетчики процесса: попадания в L1 и L2, промахи, вытеснения
+        из L1 по размеру и по журналу, полные очистки L1."""
+        return {
+            name: self._tier.stats[name] for name in (
+                'local_hits', 'shared_hits', 'misses',
+                'evictions', 'invalidations', 'resets',
+            )
+        }
+
+    # Память процесса
+
+    def _local_get(self, key):
+        tier = self._tier
+        with tier.lock:
+            entry = tier.entries.get(key)
+            if entry is None:
+                return _missing
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del tier.entries[key]
+                return _missing
+            tier.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.get_backend_timeout(timeout)
+        lifetime = self._local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout - time.time())
+        if lifetime <= 0:
+            self._local_discard([key])
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        tier = self._tier
+        with tier.lock:
+            tier.entries[key] = (pickled, time.monotonic() + lifetime)
+            tier.entries.move_to_end(key)
+            while len(tier.entries) > self._max_entries:
+                tier.entries.popitem(last=False)
+                tier.stats['evictions'] += 1
+
+    def _local_discard(self, keys):
+        tier = self._tier
+        with tier.lock:
+            for key in keys:
+                tier.entries.pop(key, None)
+
+    def _local_reset(self):
+        tier = self._tier
+        with tier.lock:
+            tier.entries.clear()
+            tier.stats['resets'] += 1
+
+    # Журнал изменений
+
+    def _sync(self, force=False):
+        """Вытесняет из L1 ключи, измененные другими процессами."""
+        tier = self._tier
+        now = time.monotonic()
+        if not force and now < tier.next_sync:
+            return
+        tier.next_sync = now + self._sync_interval
+        log = self.shared.get_many([self._sequence_key, self._epoch_key])
+        epoch = log.get(self._epoch_key)
+        sequence = log.get(self._sequence_key, 0)
+        if epoch is None:
+            self.shared.add(self._epoch_key, uuid.uuid4().hex, None)
+            epoch = self.shared.get(self._epoch_key)
+        if epoch != tier.epoch or tier.sequence is None:
+            if tier.epoch is not None:
+                self._local_reset()
+            tier.epoch, tier.sequence = epoch, sequence
+            return
+        if sequence == tier.sequence:
+            return
+        numbers = range(tier.sequence + 1, sequence + 1)
+        entries = {}
+        if 0 < len(numbers) <= MAX_REPLAY:
+            entries = self.shared.get_many([
+                ENTRY_KEY.format(channel=self._channel, number=number)
+                for number in numbers
+            ])
+        if len(entries) < len(numbers) or not numbers:
+            # Журнал устарел или счетчик сброшен
+            self._local_reset()
+        else:
+            keys = {key for changed in entries.values() for key in changed}
+            self._local_discard(keys)
+            tier.stats['invalidations'] += len(keys)
+        tier.sequence = sequence
+
+    def _broadcast(self, keys):
+        """Заносит ключи keys в журнал для остальных процессов."""
+        try:
+            number = self.shared.incr(self._sequence_key)
+        except ValueError:
+            self.shared.add(self._sequence_key, 0, None)
+            number = self.shared.incr(self._sequence_key)
+        self.shared.set(
+            ENTRY_KEY.format(channel=self._channel, number=number),
+            list(keys), self._log_timeout
+        )
+        tier = self._tier
+        if tier.sequence is not None and number == tier.sequence + 1:
+            # Своя запись: L1 уже в актуальном состоянии
+            tier.sequence = number
+
+    # Интерфейс BaseCache
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._sync()
+        value = self._local_get(key)
+        if value is not _missing:
+            self._tier.stats['local_hits'] += 1
+            return value
+        value = self.shared.get(key, _missing)
+        if value is _missing:
+            self._tier.stats['misses'] += 1
+            return default
+        self._tier.stats['shared_hits'] += 1
+        self._local_set(key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        made_keys = {self.make_key(key, version=version): key for key in keys}
+        for key in made_keys:
+            self.validate_key(key)
+        self._sync()
+        found = {}
+        for key in made_keys:
+            value = self._local_get(key)
+            if value is not _missing:
+                found[key] = value
+        stats = self._tier.stats
+        stats['local_hits'] += len(found)
+        missing = [key for key in made_keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing)
+            for key, value in shared.items():
+                self._local_set(key, value)
+            found.update(shared)
+            stats['shared_hits'] += len(shared)
+            stats['misses'] += len(missing) - len(shared)
+        return {made_keys[key]: value for key, value in found.items()}
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        # Решает только L2: add служит блокировкой между процессами,
+        # если L2 выполняет его атомарно
+        if not self.shared.add(key, value, timeout):
+            return False
+        self._local_set(key, value, timeout)
+        return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.shared.set(key, value, timeout)
+        self._local_set(key, value, timeout)
+        self._broadcast([key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {
+            self.make_key(key, version=version): value
+            for key, value in data.items()
+        }
+        for key in data:
+            self.validate_key(key)
+        failed = self.shared.set_many(data, timeout)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(key, value, timeout)
+        self._broadcast(data)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.shared.touch(key, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        try:
+            value = self.shared.incr(key, delta)
+        except ValueError:
+            self._local_discard([key])
+            raise
+        self._local_set(key, value)
+        self._broadcast([key])
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return
+        self.shared.delete_many(keys)
+        self._local_discard(keys)
+        self._broadcast(keys)
+
+    def clear(self):
+        self.shared.clear()
+        self._local_reset()
+        # Новая эпоха: остальные процессы очистят свой L1
+        self._tier.epoch = None
+        self._sync(force=True)
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class LockedFileBasedCache(FileBasedCache):
+    """Кэш в файлах с атомарными между процессами `add` и `incr`.
+
+    Проверка и запись выполняются под блокировкой файла `lock` в
+    каталоге кэша (flock), остальные операции — как у FileBasedCache.
+    """
+
+    lock_filename = 'lock'
+
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_filename), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # decr вызывает incr и тоже выполняется под блокировкой
+        with self._locked():
+            return super().incr(key, delta, version)
@@ -0,0 +1,80 @@
+"""Кэширование с защитой от одновременной перестройки (cache stampede).
+
+`get_or_build()` хранит значение вместе со сроком свежести и временем
+построения. Перестраивает значение только процесс, взявший блокировку
+`cache.add`, остальные тем временем получают прежнее значение
+(stale-while-revalidate). Свежее значение перестраивается заранее с
+вероятностью, растущей к концу срока (XFetch): истечение популярного
+ключа не приводит к одновременной перестройке во всех процессах.
+
+Значение другой версии (например, фрагмент прежнего поколения) не
+отдается: процессы ждут того, кто его перестраивает, не дольше
+`CACHE_LOCK_WAIT` секунд.
+"""
+
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_KEY = '{key}:lock'
+POLL_INTERVAL = 0.05
+
+
+def _lock(key) -> bool:
+    return cache.add(
+        LOCK_KEY.format(key=key), True, settings.CACHE_LOCK_TIMEOUT
+    )
+
+
+def _build(key, build, timeout, version):
+    try:
+        start = time.monotonic()
+        value = build()
+        delta = time.monotonic() - start
+        cache.set(
+            key, (value, version, time.time() + timeout, delta),
+            timeout + settings.CACHE_STALE_TIMEOUT
+        )
+        return value
+    finally:
+        cache.delete(LOCK_KEY.format(key=key))
+
+
+def _is_fresh(expires, delta):
+    # XFetch: -log(random()) > 0 сдвигает срок на долю времени построения
+    early = delta * settings.CACHE_XFETCH_BETA * -math.log(
+        1 - random.random()
+    )
+    return time.time() + early < expires
+
+
+def _wait(key, build, version):
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    # Перестраивающий процесс не успел: строим сами, не сохраняя
+    return build()
+
+
+def get_or_build(key, build, timeout, version=None):
+    """Значение ключа; при отсутствии или устаревании — из build().
+
+    version — отличительный признак данных (например, номера поколений):
+    значение другой версии не отдается даже как устаревшее.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, entry_version, expires, delta = entry
+        if entry_version == version:
+            if _is_fresh(expires, delta) or not _lock(key):
+                return value
+            return _build(key, build, timeout, version)
+    if _lock(key):
+        return _build(key, build, timeout, version)
+    return _wait(key, build, version)
@@ -0,0 +1,132 @@
+"""Карта объектов запроса и пакетная загрузка связанных записей.
+
+Пока обрабатывается запрос (`IdentityMapMiddleware`), записи из наборов
+`BatchedQuerySet` запоминаются вместе с соседями по выборке. Первое
+обращение к связи из `batch_related()` у любой записи загружает эту
+связь сразу для всей выборки одним запросом `IN` на модель, а уже
+загруженные за запрос объекты берутся из карты без запроса. Так число
+запросов при отрисовке не растет с числом комментариев или авторов.
+
+Вне запроса связи загружаются как обычно.
+"""
+
+from contextvars import ContextVar
+
+from django.db import models
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor,
+)
+from django.db.models.query import ModelIterable
+
+_current = ContextVar('identity_map', default=None)
+# Связи, загружаемые пакетами, по моделям
+_batched = {}
+
+
+class IdentityMap:
+    """Загруженные за запрос объекты по модели и первичному ключу."""
+
+    def __init__(self):
+        self.objects = {}
+        self.batches = {}
+
+    def add(self, obj):
+        # Объект с отложенными полями дочитывал бы их по одному
+        if not obj.get_deferred_fields():
+            self.objects.setdefault((obj._meta.label, obj.pk), obj)
+
+    def register(self, instances):
+        """Запоминает выборку и загруженные в ней связи."""
+        batch = list(instances)
+        for instance in batch:
+            self.batches[id(instance)] = batch
+            self.add(instance)
+            for field in _batched.get(type(instance), ()):
+                if field.is_cached(instance):
+                    related = field.get_cached_value(instance)
+                    if related is not None:
+                        self.add(related)
+
+    def load(self, model, pks) -> dict:
+        """Объекты model по ключам pks: из карты или одним запросом."""
+        label = model._meta.label
+        found = {
+            pk: self.objects[label, pk] for pk in pks
+            if (label, pk) in self.objects
+        }
+        missing = set(pks) - set(found)
+        if missing:
+            for obj in model._base_manager.filter(pk__in=missing):
+                self.add(obj)
+                found[obj.pk] = obj
+        return found
+
+    def resolve(self, field, instance):
+        """Загружает связь field для выборки, в которой есть instance."""
+        batch = [
+            obj for obj in self.batches.get(id(instance), [instance])
+            if not field.is_cached(obj)
+        ]
+        pks = {getattr(obj, field.attname) for obj in batch} - {None}
+        loaded = self.load(field.related_model, pks)
+        for obj in batch:
+            pk = getattr(obj, field.attname)
+            if pk is None or pk in loaded:
+                field.set_cached_value(obj, loaded.get(pk))
+
+
+def current():
+    """Карта объектов текущего запроса или None."""
+    return _current.get()
+
+
+class BatchedForwardDescriptor(ForwardManyToOneDescriptor):
+    """Связь, которая в запросе загружается для всей выборки сразу."""
+
+    def __get__(self, instance, cls=None):
+        identity_map = current()
+        if (
+            instance is not None and identity_map is not None
+            and not self.field.is_cached(instance)
+        ):
+            identity_map.resolve(self.field, instance)
+        return super().__get__(instance, cls)
+
+
+class BatchedQuerySet(models.QuerySet):
+    """Запоминает записи выборки в карте объектов запроса."""
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        identity_map = current()
+        if (
+            not fetched and identity_map is not None
+            and self.model in _batched
+            and self._iterable_class is ModelIterable
+        ):
+            identity_map.register(self._result_cache)
+
+
+def batch_related(model, *names):
+    """Загружать связи names модели model пакетами."""
+    for name in names:
+        field = model._meta.get_field(name)
+        if field.target_field != field.related_model._meta.pk:
+            raise ValueError(f'{model.__name__}.{name}: связь не по ключу')
+        setattr(model, name, BatchedForwardDescriptor(field))
+        _batched.setdefault(model, []).append(field)
+
+
+class IdentityMapMiddleware:
+    """Карта объектов на время обработки запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current.set(IdentityMap())
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,154 @@
+"""Очистка кэша обратного прокси по суррогатным ключам.
+
+Страницы отдаются с заголовком `Surrogate-Key`, и прокси может удалить
+все страницы с данным ключом одним запросом. `purge()` копит ключи и
+отправляет их пачкой: в конце запроса при `PurgeBatchMiddleware`, иначе
+после фиксации транзакции (откат отменяет ее ключи), а вне транзакции —
+сразу. Отправку выполняет класс из `PURGE_BACKEND`:
+
+* `NullPurger` — прокси нет, ключи отбрасываются;
+* `HttpPurger` — запрос PURGE на `PURGE_URL` с ключами в `Surrogate-Key`;
+* `LocalProxy` — прокси в памяти процесса для тестов.
+"""
+
+import logging
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_purger = None
+
+
+class NullPurger:
+
+    def purge(self, keys):
+        pass
+
+
+class HttpPurger:
+    """Отправляет ключи запросами PURGE по `PURGE_BATCH_SIZE` штук."""
+
+    def purge(self, keys):
+        for start in range(0, len(keys), settings.PURGE_BATCH_SIZE):
+            run_in_background(
+                self.send, keys[start:start + settings.PURGE_BATCH_SIZE]
+            )
+
+    def send(self, keys):
+        request = urllib.request.Request(
+            settings.PURGE_URL, method='PURGE',
+            headers={'Surrogate-Key': ' '.join(keys)}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=settings.PURGE_TIMEOUT)
+        except OSError:
+            logger.exception('Не удалось очистить кэш прокси: %s', keys)
+
+
+class LocalProxy:
+    """Кэширующий прокси в памяти: хранит ответы с `s-maxage` по адресу."""
+
+    def __init__(self):
+        self.pages = {}
+        self.purged = []
+
+    def get(self, client, url, **extra):
+        """Ответ из кэша прокси или от client с сохранением."""
+        if url in self.pages:
+            return self.pages[url]
+        response = client.get(url, **extra)
+        if 's-maxage' in response.get('Cache-Control', ''):
+            self.pages[url] = response
+        return response
+
+    def purge(self, keys):
+        self.purged.append(keys)
+        self.pages = {
+            url: response for url, response in self.pages.items()
+            if not set(keys) & set(response['Surrogate-Key'].split())
+        }
+
+
+def get_purger():
+    global _purger
+    if _purger is None:
+        _purger = import_string(settings.PURGE_BACKEND)()
+    return _purger
+
+
+@receiver(setting_changed)
+def reset_purger(setting, **kwargs):
+    global _purger
+    if setting == 'PURGE_BACKEND':
+        _purger = None
+
+
+class _TransactionKeys:
+    """Ключи, которые отправляются после фиксации транзакции."""
+
+    def __init__(self):
+        self.keys = set()
+
+    def __call__(self):
+        get_purger().purge(sorted(self.keys))
+
+
+def _transaction_keys() -> set:
+    """Ключи текущей транзакции. Откат отменяет отправку вместе с
+    обработчиком on_commit, и следующая транзакция начинает новый набор.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(_local, 'pending', None)
+    if pending is None or not any(
+        func is pending for _, func in connection.run_on_commit
+    ):
+        pending = _local.pending = _TransactionKeys()
+        transaction.on_commit(pending)
+    return pending.keys
+
+
+def purge(*keys):
+    """Запланировать очистку страниц с ключами keys."""
+    if not keys:
+        return
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        batch.update(keys)
+    elif transaction.get_connection().in_atomic_block:
+        _transaction_keys().update(keys)
+    else:
+        get_purger().purge(sorted(keys))
+
+
+@contextmanager
+def purge_batch():
+    """Собирает ключи внутри блока в одну пачку."""
+    _local.batch = set()
+    try:
+        yield
+    finally:
+        keys, _local.batch = _local.batch, None
+        if keys:
+            get_purger().purge(sorted(keys))
+
+
+class PurgeBatchMiddleware:
+    """Одна пачка ключей на запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with purge_batch():
+            return self.get_response(request)
@@ -0,0 +1,179 @@
+"""Кэш результатов запросов с устареванием по поколениям таблиц.
+
+Запросы `CachedQuerySet` внутри блока `cached_queries()` (или
+представления с таким декоратором) читают результат из кэша. Ключ
+строится из SQL-запроса с параметрами и номеров поколений всех таблиц,
+которые в нем упоминаются. Любая запись в таблицу увеличивает ее
+поколение: `save()` и `delete()` — сигналами моделей из `track()`, а
+`update()`, `delete()`, `bulk_create()` и `bulk_update()` набора
+записей — самим `CachedQuerySet`. Запросы к таблицам не из `track()`
+не кэшируются: об их изменениях ничего не известно.
+
+Поколение увеличивается сразу и еще раз после фиксации транзакции,
+чтобы не остался результат, прочитанный другим процессом до фиксации.
+"""
+
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import connections, models, transaction
+from django.db.models.signals import post_delete, post_save
+
+TABLE_KEY = 'core:table:{table}'
+QUERY_KEY = 'core:query:{digest}'
+
+_enabled = ContextVar('cached_queries', default=False)
+_tracked = set()
+_missing = object()
+
+
+def _key(table):
+    return TABLE_KEY.format(table=table)
+
+
+def table_generations(tables) -> list:
+    """Номера поколений таблиц в порядке tables."""
+    keys = [_key(table) for table in tables]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Как в posts.generations: время не повторит вытесненный номер
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def _bump(tables):
+    for table in tables:
+        try:
+            cache.incr(_key(table))
+        except ValueError:
+            cache.add(_key(table), time.time_ns(), None)
+
+
+def bump_tables(*tables, using='default'):
+    """Делает устаревшими результаты запросов к таблицам tables."""
+    tables = set(tables)
+    _bump(tables)
+    transaction.on_commit(lambda: _bump(tables), using=using)
+
+
+def _changed_tables(model, deleted=False) -> set:
+    tables = {model._meta.db_table}
+    if deleted:
+        # Удаление меняет ссылки на запись: SET_NULL не шлет сигналов
+        tables.update(
+            relation.related_model._meta.db_table
+            for relation in model._meta.related_objects
+        )
+    return tables & _tracked
+
+
+@contextmanager
+def cached_queries():
+    """Включает кэш запросов в блоке или представлении."""
+    token = _enabled.set(True)
+    try:
+        yield
+    finally:
+        _enabled.reset(token)
+
+
+class CachedQuerySet(models.QuerySet):
+
+    def _cache_key(self):
+        """Ключ результата или None, если запрос кэшировать нельзя."""
+        connection = connections[self.db]
+        try:
+            sql, params = self.query.get_compiler(self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        tables = [
+            table for table in _all_tables()
+            if connection.ops.quote_name(table) in sql
+        ]
+        if not tables or not _tracked.issuperset(tables):
+            return None
+        digest = hashlib.md5(repr((
+            self.db, self._iterable_class.__qualname__, sql, params,
+            table_generations(tables),
+        )).encode()).hexdigest()
+        return QUERY_KEY.format(digest=digest)
+
+    def _fetch_all(self):
+        if self._result_cache is None and _enabled.get():
+            key = self._cache_key()
+            if key is not None:
+                result = cache.get(key, _missing)
+                if result is _missing:
+                    result = list(self._iterable_class(self))
+                    cache.set(key, result, settings.QUERY_CACHE_TIMEOUT)
+                self._result_cache = result
+        super()._fetch_all()
+
+    def _changed(self, deleted=False):
+        bump_tables(*_changed_tables(self.model, deleted), using=self.db)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._changed()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        self._changed(deleted=True)
+        return result
+
+    delete.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._changed()
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        super().bulk_update(objs, fields, batch_size)
+        self._changed()
+
+
+def _all_tables():
+    return [
+        model._meta.db_table
+        for model in apps.get_models(include_auto_created=True)
+    ]
+
+
+def _saved(sender, using, **kwargs):
+    bump_tables(*_changed_tables(sender), using=using)
+
+
+def _deleted(sender, using, **kwargs):
+    bump_tables(*_changed_tables(sender, deleted=True), using=using)
+
+
+def track(*tracked_models):
+    """Кэшировать запросы к таблицам моделей tracked_models.
+
+    Менеджер модели по умолчанию должен строить `CachedQuerySet`;
+    простой `QuerySet` моделей других приложений (например, User)
+    заменяется.
+    """
+    for model in tracked_models:
+        manager = model._default_manager
+        if manager._queryset_class is models.QuerySet:
+            manager._queryset_class = CachedQuerySet
+        elif not issubclass(manager._queryset_class, CachedQuerySet):
+            raise ImproperlyConfigured(
+                f'{model.__name__}: менеджер не строит CachedQuerySet'
+            )
+        _tracked.add(model._meta.db_table)
+        post_save.connect(_saved, sender=model)
+        post_delete.connect(_deleted, sender=model)
@@ -0,0 +1,51 @@
+"""Хранилище файлов с именами по содержимому.
+
+`ContentAddressedStorage` называет файл по SHA-256 его содержимого,
+посчитанному одним проходом по частям загрузки: `posts/photo.jpg`
+сохраняется как `posts/3f/3fa9…c2.jpg`. Одинаковые загрузки получают
+одно имя и один файл, а вместе с ним — одни миниатюры. Повторная
+загрузка существующего файла не пишет его заново, а обновляет время
+изменения: по нему удаление неиспользуемых файлов откладывается, пока
+ссылка на файл не зафиксирована в базе данных.
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content) -> str:
+        """Имя файла по содержимому в каталоге из name."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        # Одновременная загрузка того же содержимого сохранится под
+        # свободным именем FileSystemStorage: копия, но не ошибка
+        return self._save(name, content).replace('\\', '/')
+
+    def save_as(self, name, content) -> str:
+        """Сохраняет производный файл (например, вариант картинки) под
+        именем name, не называя его по содержимому."""
+        return super().save(name, content)
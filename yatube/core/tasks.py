@@ -0,0 +1,108 @@
+"""Фоновое выполнение задач.
+
+Легкие задачи выполняются в пуле потоков (`run_in_background`), задачи,
+занимающие процессор, — в пуле процессов (`run_in_process`). Процессы
+запускаются заново (spawn) и перед первой задачей настраивают Django,
+поэтому задача передается путем импорта функции. Кэш и сигналы у
+процесса пула свои, поэтому задача только вычисляет, а сбрасывает кэши
+обработчик `then`, вызванный с ее результатом в этом процессе.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_process_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASKS_WORKERS,
+            thread_name_prefix='background-task'
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        # У каждого потока свои соединения с базой данных
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Выполняет функцию в пуле потоков после фиксации транзакции.
+
+    При `BACKGROUND_TASKS_EAGER` функция выполняется сразу в текущем
+    потоке: так работают тесты и сервер разработки.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        return func(*args, **kwargs)
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs)
+    )
+
+
+def _init_process():
+    django.setup()
+
+
+def process_pool(max_workers) -> ProcessPoolExecutor:
+    """Пул процессов с настроенным Django для `call_by_path`."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_process,
+    )
+
+
+def call_by_path(path, *args):
+    """Вызывает функцию по пути импорта, например в пуле процессов."""
+    return import_string(path)(*args)
+
+
+def _run_by_path(path, args):
+    try:
+        return call_by_path(path, *args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', path)
+
+
+def _submit(path, args, then):
+    future = _process_executor.submit(_run_by_path, path, args)
+    if then is not None:
+        # Обработчик результата работает в пуле потоков этого процесса
+        future.add_done_callback(
+            lambda done: _get_executor().submit(
+                _run, then, (done.result(),), {}
+            )
+        )
+
+
+def run_in_process(path, *args, then=None):
+    """Выполняет функцию по пути импорта path в пуле процессов после
+    фиксации транзакции и передает ее результат (None при ошибке)
+    обработчику then в этом процессе. При `BACKGROUND_TASKS_EAGER` — сразу.
+    """
+    global _process_executor
+    if settings.BACKGROUND_TASKS_EAGER:
+        result = _run_by_path(path, args)
+        if then is not None:
+            then(result)
+        return
+    if _process_executor is None:
+        _process_executor = process_pool(settings.BACKGROUND_PROCESS_WORKERS)
+    transaction.on_commit(lambda: _submit(path, args, then))
@@ -0,0 +1,146 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from ..cache_backends import (
+    ENTRY_KEY, SEQUENCE_KEY, LockedFileBasedCache, TwoTierCache, _LocalTier
+)
+
+CHANNEL = 'test-two-tier'
+
+
+def make_process(max_entries=100):
+    """Кэш отдельного процесса: свой L1, общий L2 и журнал."""
+    cache = TwoTierCache(CHANNEL, {'OPTIONS': {
+        'SHARED': 'shared', 'MAX_ENTRIES': max_entries, 'SYNC_INTERVAL': 0,
+    }})
+    cache._tier = _LocalTier()
+    return cache
+
+
+class TestTwoTierCache(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.first = make_process()
+        self.second = make_process()
+
+    def test_local_hits(self):
+        """Повторное чтение обслуживает память процесса"""
+        self.first.set('key', 'значение')
+        self.assertEqual(self.second.get('key'), 'значение')
+        self.assertEqual(self.second.get('key'), 'значение')
+        self.assertEqual(self.second.get('missing'), None)
+        stats = self.second.stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_delete_reaches_other_process(self):
+        """Удаление вытесняет ключ из памяти остальных процессов"""
+        self.first.set('key', 'значение')
+        self.second.get('key')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.assertEqual(self.second.stats()['invalidations'], 1)
+
+    def test_write_reaches_other_process(self):
+        """Запись и увеличение счетчика видны остальным процессам"""
+        self.first.set_many({'key': 'старое', 'counter': 1})
+        self.second.get_many(['key', 'counter'])
+        self.first.set('key', 'новое')
+        self.first.incr('counter')
+        self.assertEqual(
+            self.second.get_many(['key', 'counter']),
+            {'key': 'новое', 'counter': 2}
+        )
+
+    def test_lru_eviction(self):
+        """Память процесса ограничена, вытесняются давно читанные ключи"""
+        cache = make_process(max_entries=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+    def test_clear_resets_other_process(self):
+        """Очистка кэша очищает память остальных процессов"""
+        self.first.set('key', 'значение')
+        self.second.get('key')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+        self.assertEqual(self.second.stats()['resets'], 1)
+
+    def test_lost_log_resets(self):
+        """Потерянная запись журнала очищает память процесса целиком"""
+        self.first.set('key', 'значение')
+        self.second.get('key')
+        self.first.set('key', 'новое')
+        shared = caches['shared']
+        shared.delete(ENTRY_KEY.format(
+            channel=CHANNEL,
+            number=shared.get(SEQUENCE_KEY.format(channel=CHANNEL))
+        ))
+        self.assertEqual(self.second.get('key'), 'новое')
+        self.assertEqual(self.second.stats()['resets'], 1)
+
+    def test_add_decided_by_shared_cache(self):
+        """add удается только одному процессу"""
+        self.assertTrue(self.first.add('lock', True))
+        self.assertFalse(self.second.add('lock', True))
+
+
+INCREMENTS = 50
+
+
+def increment(location):
+    cache = LockedFileBasedCache(location, {})
+    for _ in range(INCREMENTS):
+        cache.incr('counter')
+
+
+def add_lock(location, results):
+    results.put(LockedFileBasedCache(location, {}).add('lock', True))
+
+
+class TestLockedFileBasedCache(SimpleTestCase):
+    """add и incr атомарны для нескольких процессов"""
+
+    processes = 4
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.context = multiprocessing.get_context('fork')
+
+    def run_processes(self, target, *args):
+        processes = [
+            self.context.Process(target=target, args=(self.location, *args))
+            for _ in range(self.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+    def test_incr(self):
+        """Одновременные incr не теряют приращений"""
+        cache = LockedFileBasedCache(self.location, {})
+        cache.set('counter', 0)
+        self.run_processes(increment)
+        self.assertEqual(cache.get('counter'), self.processes * INCREMENTS)
+
+    def test_add(self):
+        """Блокировку через add получает ровно один процесс"""
+        results = self.context.Queue()
+        self.run_processes(add_lock, results)
+        self.assertEqual(
+            sorted(results.get() for _ in range(self.processes)),
+            [False] * (self.processes - 1) + [True]
+        )
@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from ..caching import LOCK_KEY, get_or_build
+
+KEY = 'test:stampede'
+TIMEOUT = 60
+
+
+class TestGetOrBuild(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return f'новое {self.builds}'
+
+    def store(self, value, expires_in, version=None, delta=0.01):
+        cache.set(KEY, (value, version, time.time() + expires_in, delta))
+
+    def lock(self):
+        cache.add(LOCK_KEY.format(key=KEY), True)
+
+    def test_single_build(self):
+        """Значение строится один раз и дальше читается из кэша"""
+        for _ in range(3):
+            self.assertEqual(get_or_build(KEY, self.build, TIMEOUT), 'новое 1')
+        self.assertEqual(self.builds, 1)
+
+    def test_stale_while_rebuilding(self):
+        """Пока другой процесс перестраивает значение, отдается прежнее"""
+        self.store('старое', expires_in=-1)
+        self.lock()
+        self.assertEqual(get_or_build(KEY, self.build, TIMEOUT), 'старое')
+        self.assertEqual(self.builds, 0)
+
+    def test_expired_rebuilt(self):
+        """Устаревшее значение перестраивает взявший блокировку"""
+        self.store('старое', expires_in=-1)
+        self.assertEqual(get_or_build(KEY, self.build, TIMEOUT), 'новое 1')
+        self.assertIsNone(cache.get(LOCK_KEY.format(key=KEY)))
+
+    @override_settings(CACHE_XFETCH_BETA=10 ** 6)
+    def test_early_refresh(self):
+        """Значение перестраивается заранее, если построение долгое"""
+        self.store('старое', expires_in=TIMEOUT, delta=1)
+        self.assertEqual(get_or_build(KEY, self.build, TIMEOUT), 'новое 1')
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_other_version_not_served(self):
+        """Значение прежней версии не отдается даже при блокировке"""
+        self.store('старое', expires_in=TIMEOUT, version=1)
+        self.lock()
+        self.assertEqual(
+            get_or_build(KEY, self.build, TIMEOUT, version=2), 'новое 1'
+        )
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from ..purge import get_purger, purge, purge_batch
+
+
+@override_settings(PURGE_BACKEND='core.purge.LocalProxy')
+class TestPurge(TransactionTestCase):
+
+    def setUp(self):
+        # Прокси один на весь класс с override_settings
+        get_purger().purged.clear()
+
+    def test_outside_transaction(self):
+        """Вне транзакции ключи отправляются сразу"""
+        purge('post-1')
+        self.assertEqual(get_purger().purged, [['post-1']])
+
+    def test_after_commit(self):
+        """Ключи транзакции отправляются одной пачкой после фиксации"""
+        with transaction.atomic():
+            purge('post-1')
+            purge('post-2', 'post-1')
+            self.assertEqual(get_purger().purged, [])
+        self.assertEqual(get_purger().purged, [['post-1', 'post-2']])
+
+    def test_rollback(self):
+        """Откат отменяет ключи транзакции, но не следующие очистки"""
+        try:
+            with transaction.atomic():
+                purge('post-1')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        purge('post-2')
+        with transaction.atomic():
+            purge('post-3')
+        self.assertEqual(get_purger().purged, [['post-2'], ['post-3']])
+
+    def test_batch(self):
+        """В пачке ключи копятся до конца блока"""
+        with purge_batch():
+            purge('post-1')
+            with transaction.atomic():
+                purge('post-2')
+            self.assertEqual(get_purger().purged, [])
+        purge('post-3')
+        self.assertEqual(
+            get_purger().purged, [['post-1', 'post-2'], ['post-3']]
+        )
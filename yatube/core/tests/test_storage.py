@@ -0,0 +1,47 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from ..storage import ContentAddressedStorage
+
+CONTENT = b'content' * 1000
+
+
+class TestContentAddressedStorage(SimpleTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_named_by_content(self):
+        """Файл называется по SHA-256 содержимого в каталоге загрузки"""
+        digest = hashlib.sha256(CONTENT).hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(CONTENT))
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), CONTENT)
+
+    def test_identical_uploads_shared(self):
+        """Одинаковые загрузки получают один файл, повторная обновляет
+        его время изменения"""
+        first = self.storage.save('posts/a.jpg', ContentFile(CONTENT))
+        path = self.storage.path(first)
+        os.utime(path, (0, 0))
+        second = self.storage.save('posts/b.jpg', ContentFile(CONTENT))
+        self.assertEqual(first, second)
+        self.assertGreater(os.path.getmtime(path), 0)
+        other = self.storage.save('posts/a.jpg', ContentFile(b'other'))
+        self.assertNotEqual(other, first)
+        self.assertEqual(len(self.storage.listdir('posts')[0]), 2)
+
+    def test_save_as(self):
+        """Производный файл сохраняется под заданным именем"""
+        name = self.storage.save_as(
+            'posts/a.jpg.webp', ContentFile(CONTENT)
+        )
+        self.assertEqual(name, 'posts/a.jpg.webp')
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Управление публикациями'
+
+    def ready(self):
+        from core.loaders import batch_related
+        from core.querycache import track
+
+        from . import signals  # noqa: F401
+        from .models import Comment, Follow, Group, Post, User, UserStats
+        track(Post, Group, Comment, Follow, UserStats, User)
+        batch_related(Post, 'author', 'group')
+        batch_related(Comment, 'author')
+        batch_related(Follow, 'user', 'author')
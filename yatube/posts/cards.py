@@ -0,0 +1,51 @@
+"""Кэш отрисованных карточек публикаций.
+
+Ключ карточки включает номер публикации, время ее изменения и отпечаток
+показанных в ней данных автора, группы и числа комментариев. Правка
+публикации, переименование группы или автора и новый комментарий меняют
+ключ только затронутых карточек, остальные берутся из кэша одним
+запросом на страницу.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .thumbnails import prefetch_thumbnails
+
+CARD_KEY = 'posts:card:{pk}:{version}'
+CARD_TEMPLATE = 'posts/includes/post.html'
+
+
+def card_key(post, **options) -> str:
+    author, group = post.author, post.group
+    shown = (
+        author.username, author.first_name, author.last_name,
+        group and group.title, group and group.slug,
+        getattr(post, 'comment_count', None), sorted(options.items()),
+    )
+    digest = hashlib.md5(repr(shown).encode()).hexdigest()
+    return CARD_KEY.format(
+        pk=post.pk, version=f'{post.updated_at.timestamp()}:{digest}'
+    )
+
+
+def render_cards(posts, **options) -> list:
+    """HTML карточек публикаций в порядке posts.
+
+    options передаются в шаблон карточки: hide_author, hide_group_link.
+    """
+    keys = [card_key(post, **options) for post in posts]
+    cards = cache.get_many(keys)
+    prefetch_thumbnails(
+        [post for key, post in zip(keys, posts) if key not in cards], 'card'
+    )
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post, **options})
+        for key, post in zip(keys, posts) if key not in cards
+    }
+    cache.set_many(missing, settings.CARD_CACHE_TIMEOUT)
+    cards.update(missing)
+    return [cards[key] for key in keys]
@@ -0,0 +1,81 @@
+"""Поколения кэшируемых фрагментов.
+
+Фрагмент шаблона или страница кэшируется под ключом, в который входят
+номера поколений его областей: 'index' — главная страница, 'group:<pk>' и
+'author:<pk>' — ленты группы и автора вместе со счетчиками автора,
+'post:<pk>' — страница публикации, 'follow:<pk>' — материализованная
+лента подписок пользователя, 'groups' и 'users' — названия групп и
+имена пользователей. Сигналы увеличивают номера затронутых
+областей, и старые фрагменты перестают читаться сразу после записи, а не
+по истечении срока хранения. Вместе с поколением очищаются страницы
+в кэше обратного прокси с суррогатным ключом области (`core.purge`):
+'author:5' — 'author-5', а для групп — 'group-<slug>'.
+"""
+
+import time
+
+from django.core.cache import cache
+
+from core.purge import purge
+
+from .models import Group
+
+GENERATION_KEY = 'posts:generation:{scope}'
+
+
+def _key(scope):
+    return GENERATION_KEY.format(scope=scope)
+
+
+def get_generations(*scopes) -> list:
+    """Номера поколений областей в порядке scopes."""
+    keys = [_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Время вместо единицы: вытесненное из кэша поколение
+            # не повторит номер, под которым уже сохранены фрагменты
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def surrogate_key(scope) -> str:
+    """Суррогатный ключ страниц области, кроме групп."""
+    return scope.replace(':', '-')
+
+
+def bump(*scopes):
+    """Делает устаревшими фрагменты и страницы областей scopes."""
+    for scope in set(scopes):
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.add(_key(scope), time.time_ns(), None)
+    # Ключи групп строятся по slug: их очищает вызывающий код, а личные
+    # ленты подписок обратный прокси не кэширует
+    purge(*(
+        surrogate_key(scope) for scope in scopes
+        if not scope.startswith(('group:', 'follow:'))
+    ))
+
+
+def purge_groups(group_ids):
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    purge(*(f'group-{slug}' for slug in slugs))
+
+
+def expire_feeds(authors=(), groups=(), posts=()):
+    """Делает устаревшими главную страницу, ленты авторов и групп и
+    страницы публикаций."""
+    groups = [pk for pk in groups if pk]
+    bump(
+        'index',
+        *(f'post:{pk}' for pk in posts),
+        *(f'author:{pk}' for pk in authors),
+        *(f'group:{pk}' for pk in groups),
+    )
+    if groups:
+        purge_groups(groups)
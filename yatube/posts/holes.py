@@ -0,0 +1,88 @@
+"""Персональные части страниц поверх общего кэша (hole punching).
+
+Кэшируемые фрагменты одинаковы для всех посетителей, а то, что зависит
+от пользователя, остается в них меткой `<!--hole:имя аргументы-->`.
+`HolePunchMiddleware` заменяет метки в готовом ответе: кнопки правки
+сверяются с номером пользователя, кнопки подписки — с кэшированным
+множеством авторов, на которых он подписан.
+"""
+
+import re
+
+from django.template.loader import get_template
+
+from .merge import following_ids
+
+HOLE = '<!--hole:{name}{args}-->'
+HOLE_RE = re.compile(r'<!--hole:(\w+)((?: [^ >]*)*)-->')
+HOLE_MARK = b'<!--hole:'
+
+
+def punch(name, *args) -> str:
+    """Метка на месте персональной части страницы."""
+    return HOLE.format(name=name, args=''.join(f' {arg}' for arg in args))
+
+
+def _edit(request, post_id, author_id):
+    if str(request.user.pk) != author_id:
+        return ''
+    return get_template('posts/holes/edit.html').render({'post_id': post_id})
+
+
+def _follow(request, author_id, username):
+    user = request.user
+    if not user.is_authenticated or str(user.pk) == author_id:
+        return ''
+    return get_template('posts/holes/follow.html').render({
+        'username': username,
+        'following': int(author_id) in following_ids(user.pk),
+    })
+
+
+def _switcher(request, active):
+    return get_template('posts/includes/switcher.html').render({
+        'user': request.user, active: True,
+    })
+
+
+def _nav(request, name=''):
+    return get_template('includes/nav_user.html').render({
+        'user': request.user, 'name': name,
+    })
+
+
+HOLES = {
+    'edit': _edit,
+    'follow': _follow,
+    'switcher': _switcher,
+    'nav': _nav,
+}
+
+
+def fill_holes(content: str, request) -> str:
+    """Заполняет метки страницы для пользователя запроса."""
+    return HOLE_RE.sub(
+        lambda match: HOLES[match[1]](request, *match[2].split()), content
+    )
+
+
+class HolePunchMiddleware:
+    """Заполняет метки в HTML-ответах."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or not response.get('Content-Type', '').startswith('text/html')
+            or HOLE_MARK not in response.content
+        ):
+            return response
+        response.content = fill_holes(
+            response.content.decode(response.charset), request
+        )
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
+        return response
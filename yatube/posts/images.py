@@ -0,0 +1,190 @@
+"""Прием картинок публикаций.
+
+`PostForm` пропускает загруженную картинку через `ingest()`. Размер
+файла и число пикселей проверяются до декодирования: Pillow читает из
+файла только заголовок, и «бомба» распаковки отклоняется без выделения
+памяти под пиксели. Картинка больше `POST_IMAGE_MAX_SIZE` по большей
+стороне или с метаданными (EXIF с геометкой, XMP, текстовые блоки PNG)
+перекодируется: поворачивается по EXIF, уменьшается и сохраняется без
+метаданных в JPEG, а с прозрачностью — в PNG. Анимация (GIF, APNG,
+WebP) перекодируется покадрово в своем формате с прежними задержками
+кадров. Небольшая картинка без метаданных сохраняется как есть, байт в
+байт.
+
+WebP-вариант картинки (`save_webp()`) строится вместе с миниатюрами в
+пуле процессов и лежит рядом с файлом: `posts/photo.jpg.webp`.
+
+Файлы называются по содержимому (`core.storage`), и одну картинку
+могут использовать несколько публикаций. После удаления публикации или
+замены картинки `release()` удаляет файл с вариантом и миниатюрами,
+если на него больше не ссылается ни одна публикация и он не загружался
+заново последние `POST_IMAGE_RELEASE_DELAY` секунд.
+"""
+
+import os
+import warnings
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, ImageSequence
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.tasks import run_in_background
+
+from .models import Post
+
+# Ключи Image.info с метаданными, которые не сохраняются; у PNG
+# метаданные также все текстовые блоки (tEXt, zTXt, iTXt)
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+
+def _open(upload):
+    """Открывает картинку, читая только заголовок."""
+    upload.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            return Image.open(upload)
+        except (Image.DecompressionBombError,
+                Image.DecompressionBombWarning):
+            raise ValidationError(
+                'Слишком большая картинка', code='image_pixels'
+            )
+
+
+def _has_alpha(image) -> bool:
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _has_metadata(image) -> bool:
+    if any(key in image.info for key in METADATA_KEYS):
+        return True
+    # Текст после данных PNG читается вместе с пикселями, поэтому
+    # проверка идет после ограничения их числа
+    return image.format == 'PNG' and bool(image.text)
+
+
+def _encode(image) -> tuple:
+    """Байты картинки без метаданных и расширение файла."""
+    output = BytesIO()
+    options = {'optimize': True}
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    alpha = _has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    # convert() копирует info, а из него PNG записал бы EXIF
+    image.info = {}
+    if alpha:
+        image.save(output, 'PNG', **options)
+        return output.getvalue(), 'png'
+    image.save(
+        output, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+        progressive=True, **options
+    )
+    return output.getvalue(), 'jpg'
+
+
+def _encode_animation(image, max_size) -> tuple:
+    """Байты уменьшенной анимации без метаданных в ее формате и
+    расширение файла."""
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((max_size, max_size), Image.LANCZOS)
+        frame.info = {}
+        frames.append(frame)
+    output = BytesIO()
+    frames[0].save(
+        output, image.format, save_all=True, append_images=frames[1:],
+        duration=durations, loop=image.info.get('loop', 0)
+    )
+    return output.getvalue(), image.format.lower()
+
+
+def ingest(upload):
+    """Проверяет загруженную картинку и возвращает файл для сохранения:
+    тот же или перекодированный. Нарушение ограничений — ValidationError.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ', code='file_size',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20}
+        )
+    image = _open(upload)
+    if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей', code='image_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6}
+        )
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    if max(image.size) <= max_size and not _has_metadata(image):
+        upload.seek(0)
+        return upload
+    if getattr(image, 'is_animated', False):
+        content, extension = _encode_animation(image, max_size)
+    else:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        content, extension = _encode(image)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(content, name=f'{stem}.{extension}')
+
+
+def webp_name(name) -> str:
+    return f'{name}.webp'
+
+
+def save_webp(image) -> bool:
+    """Сохраняет WebP-вариант картинки image (FieldFile), если его нет."""
+    name = webp_name(image.name)
+    if image.storage.exists(name):
+        return False
+    with image.storage.open(image.name) as file, Image.open(file) as source:
+        source = source.convert('RGBA' if _has_alpha(source) else 'RGB')
+        output = BytesIO()
+        source.save(
+            output, 'WEBP', quality=settings.POST_IMAGE_QUALITY, method=6
+        )
+    image.storage.save_as(name, ContentFile(output.getvalue()))
+    return True
+
+
+def release(name) -> bool:
+    """Удаляет файл картинки name, ее WebP-вариант и миниатюры, если
+    файл больше не нужен."""
+    storage = Post._meta.get_field('image').storage
+    try:
+        if not storage.exists(name):
+            return False
+    except SuspiciousFileOperation:
+        # Имя вне хранилища: файл не наш
+        return False
+    recent = timezone.now() - timedelta(
+        seconds=settings.POST_IMAGE_RELEASE_DELAY
+    )
+    # Время изменения проверяется первым: повторная загрузка обновляет
+    # его до того, как ссылка на файл появится в базе данных
+    if storage.get_modified_time(name) > recent:
+        return False
+    if Post.objects.filter(image=name).exists():
+        return False
+    default.kvstore.delete(ImageFile(name, storage))
+    storage.delete(webp_name(name))
+    storage.delete(name)
+    return True
+
+
+def release_later(name):
+    """Освобождает файл картинки после фиксации транзакции."""
+    if name:
+        run_in_background(release, name)
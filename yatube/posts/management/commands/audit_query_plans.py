@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.plans import explain, feed_queries, plan_problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет планы запросов лент: без полного просмотра таблиц '
+        'и временной сортировки'
+    )
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, query in feed_queries().items():
+            plan = explain(query)
+            problems = plan_problems(plan)
+            style = self.style.ERROR if problems else self.style.SUCCESS
+            self.stdout.write(style(name))
+            for step in plan:
+                self.stdout.write(f'    {step}')
+            if problems:
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                f'Запросы без подходящего индекса: {", ".join(failed)}'
+            )
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import User
+from posts.paginators import KeysetPaginator
+from posts.timeline import get_follow_feed
+
+MODES = ('join', 'timeline', 'hybrid', 'merge')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает режимы ленты подписок по времени и числу запросов '
+        'и сверяет их результаты с соединением через подписки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20,
+                            help='число подписчиков в выборке')
+        parser.add_argument('--pages', type=int, default=5,
+                            help='число страниц ленты на подписчика')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='число повторов чтения')
+
+    def read(self, user, mode, pages):
+        feed, keys = get_follow_feed(user, mode)
+        paginator = KeysetPaginator(feed, settings.POSTS_PER_PAGE, keys)
+        page = paginator.get_page()
+        posts = list(page)
+        for _ in range(pages - 1):
+            if not page.has_next():
+                break
+            page = paginator.get_page(after=page.next_cursor)
+            posts += page
+        return [post.pk for post in posts]
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(
+            follower__isnull=False
+        ).distinct()[:options['users']])
+        expected = {
+            user.pk: self.read(user, 'join', options['pages'])
+            for user in users
+        }
+        self.stdout.write(
+            f'{"режим":<10}{"мс/лента":>12}{"запросов":>10}{"расхождений":>14}'
+        )
+        for mode in MODES:
+            elapsed, queries, mismatches = 0, 0, 0
+            for _ in range(options['repeat']):
+                for user in users:
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        result = self.read(user, mode, options['pages'])
+                        elapsed += time.perf_counter() - start
+                    queries += len(captured)
+                    mismatches += result != expected[user.pk]
+            reads = max(len(users) * options['repeat'], 1)
+            self.stdout.write(
+                f'{mode:<10}{elapsed * 1000 / reads:>12.2f}'
+                f'{queries / reads:>10.1f}{mismatches:>14}'
+            )
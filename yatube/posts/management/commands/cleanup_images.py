@@ -0,0 +1,40 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+
+from posts.images import release, webp_name
+from posts.models import Post
+
+
+def walk(storage, directory):
+    """Имена всех файлов каталога хранилища и его подкаталогов."""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни одна '
+            'публикация, вместе с их вариантами и миниатюрами')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            self.stdout.write('Картинок нет')
+            return
+        names = set(walk(storage, directory))
+        # Варианты удаляются вместе с картинкой; варианты без картинки
+        # проверяются как отдельные файлы
+        names -= {webp_name(name) for name in names}
+        checked = removed = 0
+        for name in sorted(names):
+            checked += 1
+            if release(name):
+                removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {checked}, удалено: {removed}'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики пользователей по базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='число пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk, rebuilt = 0, 0
+        while True:
+            user_ids = list(User.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            rebuilt += len(rebuild_stats(user_ids))
+            last_pk = user_ids[-1]
+            self.stdout.write(f'Пересчитано: {rebuilt}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны для {rebuilt} пользователей'
+        ))
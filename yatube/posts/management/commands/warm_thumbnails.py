@@ -0,0 +1,108 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import call_by_path, process_pool
+from posts.images import webp_name
+from posts.models import Post
+from posts.thumbnails import find_thumbnails, thumbnails_ready
+
+BUILD_PATH = 'posts.thumbnails.build_thumbnails'
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры всех размеров POST_THUMBNAILS и WebP-варианты '
+            'картинок публикаций, пропуская уже построенные')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='число публикаций в одной порции')
+        parser.add_argument('--workers', type=int,
+                            default=settings.BACKGROUND_PROCESS_WORKERS,
+                            help='число процессов; 0 — строить в этом '
+                                 'процессе')
+        parser.add_argument('--checkpoint',
+                            help='файл с ключом последней обработанной '
+                                 'публикации: прерванный обход '
+                                 'продолжается с него')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checkpoint = options['checkpoint'] and Path(options['checkpoint'])
+        last_pk = 0
+        if checkpoint and checkpoint.exists():
+            last_pk = int(checkpoint.read_text())
+            self.stdout.write(f'Продолжение после публикации {last_pk}')
+        pool = options['workers'] and process_pool(options['workers'])
+        counts = dict.fromkeys(('images', 'skipped', 'built', 'failed'), 0)
+        start = time.perf_counter()
+        try:
+            while True:
+                # Порция читается целиком: открытый курсор мешал бы
+                # процессам записывать миниатюры (блокировка SQLite)
+                chunk = list(Post.objects.exclude(image='').filter(
+                    pk__gt=last_pk
+                ).order_by('pk').only('pk', 'image')[:chunk_size])
+                if not chunk:
+                    break
+                self._warm(chunk, pool, counts)
+                last_pk = chunk[-1].pk
+                if checkpoint:
+                    checkpoint.write_text(str(last_pk))
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'Обработано: {counts["images"]}, '
+                    f'{counts["images"] / elapsed:.1f} изобр./с'
+                )
+        finally:
+            if pool:
+                pool.shutdown()
+        if checkpoint and checkpoint.exists():
+            checkpoint.unlink()
+        elapsed = time.perf_counter() - start
+        summary = (
+            f'Картинок: {counts["images"]}, уже готовы: {counts["skipped"]}, '
+            f'построено миниатюр: {counts["built"]}, ошибок: '
+            f'{counts["failed"]}, {counts["images"] / elapsed:.1f} '
+            f'изобр./с за {elapsed:.1f} с'
+        )
+        style = self.style.ERROR if counts['failed'] else self.style.SUCCESS
+        self.stdout.write(style(summary))
+
+    def _warm(self, chunk, pool, counts):
+        """Строит миниатюры порции, не трогая публикации с готовыми."""
+        found = find_thumbnails(
+            (post.image, size)
+            for post in chunk for size in settings.POST_THUMBNAILS
+        )
+        stale = [
+            post for post in chunk
+            if any(found[post.image.name, size] is None
+                   for size in settings.POST_THUMBNAILS)
+            or not post.image.storage.exists(webp_name(post.image.name))
+        ]
+        counts['images'] += len(chunk)
+        counts['skipped'] += len(chunk) - len(stale)
+        if pool:
+            results = [
+                (post, pool.submit(call_by_path, BUILD_PATH, post.pk))
+                for post in stale
+            ]
+        else:
+            results = [(post, None) for post in stale]
+        for post, future in results:
+            try:
+                if future is None:
+                    built = call_by_path(BUILD_PATH, post.pk)
+                else:
+                    built = future.result()
+                counts['built'] += built
+                # Кэши сбрасываются здесь: у процессов пула они свои
+                thumbnails_ready(post.pk, built)
+            except Exception as error:
+                counts['failed'] += 1
+                self.stderr.write(
+                    f'Публикация {post.pk} ({post.image.name}): {error!r}'
+                )
@@ -0,0 +1,200 @@
+"""Сборка ленты k-путевым слиянием по авторам.
+
+Для каждого автора в кэше хранится ограниченный список ключей
+`(pub_date, pk)` его последних публикаций, новые первыми. Страница ленты
+подписчика собирается слиянием на куче списков авторов, на которых он
+подписан, поэтому стоимость страницы зависит от числа авторов и размера
+страницы, а не от размера таблицы публикаций.
+"""
+
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post
+from .paginators import POST_KEYS, keyset_condition
+from .services import get_feed
+
+RECENT_POSTS_KEY = 'posts:recent:{author_id}'
+FOLLOWING_KEY = 'posts:following:{user_id}'
+
+
+def _recent_key(author_id):
+    return RECENT_POSTS_KEY.format(author_id=author_id)
+
+
+def recent_posts(author_ids) -> dict:
+    """Ключи последних публикаций авторов, не больше `AUTHOR_RECENT_POSTS`.
+
+    Отсутствующие в кэше списки строятся по одному запросу на автора.
+    """
+    keys = {_recent_key(author_id): author_id for author_id in author_ids}
+    recent = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = {}
+    for author_id in set(author_ids) - set(recent):
+        recent[author_id] = list(
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-pk'
+            ).values_list('pub_date', 'pk')[:settings.AUTHOR_RECENT_POSTS]
+        )
+        missing[_recent_key(author_id)] = recent[author_id]
+    cache.set_many(missing, settings.AUTHOR_RECENT_POSTS_TIMEOUT)
+    return recent
+
+
+def add_recent_post(post):
+    """Вставляет новую публикацию в кэшированный список автора."""
+    key = _recent_key(post.author_id)
+    recent = cache.get(key)
+    if recent is None:
+        return
+    post_key = (post.pub_date, post.pk)
+    position = next(
+        (i for i, item in enumerate(recent) if item < post_key), len(recent)
+    )
+    recent.insert(position, post_key)
+    cache.set(
+        key, recent[:settings.AUTHOR_RECENT_POSTS],
+        settings.AUTHOR_RECENT_POSTS_TIMEOUT
+    )
+
+
+def forget_recent_posts(author_ids):
+    cache.delete_many([_recent_key(author_id) for author_id in author_ids])
+
+
+def remove_recent_post(post):
+    """Убирает удаленную публикацию из кэшированного списка автора."""
+    key = _recent_key(post.author_id)
+    recent = cache.get(key)
+    post_key = (post.pub_date, post.pk)
+    if recent is None or post_key not in recent:
+        return
+    if len(recent) >= settings.AUTHOR_RECENT_POSTS:
+        # Полный список нечем дополнить: он строится заново при чтении
+        cache.delete(key)
+        return
+    recent.remove(post_key)
+    cache.set(key, recent, settings.AUTHOR_RECENT_POSTS_TIMEOUT)
+
+
+def following_ids(user_id) -> set:
+    """Авторы, на которых подписан пользователь."""
+    key = FOLLOWING_KEY.format(user_id=user_id)
+    authors = cache.get(key)
+    if authors is None:
+        authors = set(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True))
+        cache.set(key, authors, settings.AUTHOR_RECENT_POSTS_TIMEOUT)
+    return authors
+
+
+def forget_following(user_id):
+    cache.delete(FOLLOWING_KEY.format(user_id=user_id))
+
+
+class QuerySource:
+    """Источник ключей ленты из запроса к базе данных."""
+
+    def __init__(self, queryset, keys=POST_KEYS):
+        self.queryset = queryset
+        self.keys = keys
+
+    def count(self):
+        return self.queryset.count()
+
+    def get_keys(self, limit, after=None, before=None):
+        """До limit ключей старше after или, по возрастанию, новее before."""
+        query = self.queryset
+        if before is not None:
+            query = query.filter(
+                keyset_condition(self.keys, before, 'gt')
+            ).order_by(*self.keys)
+        else:
+            if after is not None:
+                query = query.filter(keyset_condition(self.keys, after, 'lt'))
+            query = query.order_by(*(f'-{key}' for key in self.keys))
+        return list(query.values_list(*self.keys)[:limit])
+
+
+class AuthorSource:
+    """Публикации автора: из кэша последних, глубже — из базы данных."""
+
+    def __init__(self, author_id, recent):
+        self.recent = recent
+        self.query = QuerySource(Post.objects.filter(author_id=author_id))
+
+    @property
+    def complete(self):
+        """В кэше все публикации автора."""
+        return len(self.recent) < settings.AUTHOR_RECENT_POSTS
+
+    def count(self):
+        return len(self.recent) if self.complete else self.query.count()
+
+    def get_keys(self, limit, after=None, before=None):
+        if before is not None:
+            if self.complete or (self.recent and before >= self.recent[-1]):
+                return [key for key in reversed(self.recent)
+                        if key > before][:limit]
+        else:
+            keys = [key for key in self.recent
+                    if after is None or key < after][:limit]
+            if len(keys) == limit or self.complete:
+                return keys
+        return self.query.get_keys(limit, after, before)
+
+
+class MergedFeed:
+    """Лента, собранная слиянием упорядоченных источников ключей.
+
+    Поддерживает срезы для `Paginator` и `keyset_slice` для
+    `KeysetPaginator`; записи загружаются одним запросом `get_feed()`.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def get_keys(self, limit, after=None, before=None):
+        merged = heapq.merge(
+            *(source.get_keys(limit, after, before)
+              for source in self.sources),
+            reverse=before is None
+        )
+        # Одна публикация может прийти из нескольких источников
+        return [key for key, _ in islice(groupby(merged), limit)]
+
+    def load(self, keys):
+        if not keys:
+            return []
+        posts = get_feed().in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return self.load(self.get_keys(index.stop)[index])
+
+    def keyset_slice(self, values, reverse, limit):
+        if values is not None:
+            values = tuple(values)
+        return self.load(self.get_keys(
+            limit, **{'before' if reverse else 'after': values}
+        ))
+
+
+def get_merged_feed(user) -> MergedFeed:
+    """Лента подписок, собранная только из списков авторов."""
+    authors = following_ids(user.pk)
+    recent = recent_posts(authors)
+    return MergedFeed([
+        AuthorSource(author_id, recent[author_id]) for author_id in authors
+    ])
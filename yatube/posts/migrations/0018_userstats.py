@@ -0,0 +1,47 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    for user in User.objects.all():
+        UserStats.objects.create(
+            user=user,
+            posts=Post.objects.filter(author=user).count(),
+            comments=Comment.objects.filter(author=user).count(),
+            follows=Follow.objects.filter(user=user).count(),
+            followers=Follow.objects.filter(author=user).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='публикаций')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='комментариев')),
+                ('follows', models.PositiveIntegerField(default=0, verbose_name='подписок')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='подписчиков')),
+            ],
+            options={
+                'verbose_name': 'статистика пользователя',
+                'verbose_name_plural': 'статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+def copy_pub_date(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated_at=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='изменена'),
+        ),
+        migrations.RunPython(copy_pub_date, migrations.RunPython.noop),
+    ]
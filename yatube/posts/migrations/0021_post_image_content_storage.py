@@ -0,0 +1,37 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:51
+
+import core.storage
+from django.db import migrations, models
+
+
+def rename_by_content(apps, schema_editor):
+    """Переносит картинки под имена по содержимому. Прежние файлы и их
+    миниатюры удаляет команда cleanup_images, новые миниатюры строит
+    warm_thumbnails."""
+    Post = apps.get_model('posts', 'Post')
+    storage = Post._meta.get_field('image').storage
+    for pk, name in list(Post.objects.exclude(image='').values_list(
+        'pk', 'image'
+    )):
+        if not storage.exists(name):
+            continue
+        with storage.open(name) as file:
+            new_name = storage.save(name, file)
+        if new_name != name:
+            Post.objects.filter(pk=pk).update(image=new_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, help_text='выберите графический файл', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='картинка'),
+        ),
+        migrations.RunPython(rename_by_content, migrations.RunPython.noop),
+    ]
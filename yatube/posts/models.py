@@ -1,9 +1,22 @@
 from django.db import models
 from django.db.models import Q, F
 from django.contrib.auth import get_user_model
+from django.dispatch import Signal
+
+from core.loaders import BatchedQuerySet
+from core.querycache import CachedQuerySet
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# bulk_create не отправляет post_save, поэтому о массовой вставке
+# публикаций сообщает отдельный сигнал
+posts_bulk_created = Signal(providing_args=['posts'])
+
+
+class BaseQuerySet(BatchedQuerySet, CachedQuerySet):
+    """Набор записей с кэшем запросов и пакетной загрузкой связей."""
+
 
 class Group(models.Model):
     """Модель группы."""
@@ -12,6 +25,8 @@ class Group(models.Model):
     slug = models.SlugField(unique=True, verbose_name='идентификатор')
     description = models.TextField(verbose_name='описание')
 
+    objects = BaseQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'группу'  # accusative
         verbose_name_plural = 'группы'
@@ -20,6 +35,14 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(BaseQuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        posts = super().bulk_create(objs, *args, **kwargs)
+        posts_bulk_created.send(sender=self.model, posts=posts)
+        return posts
+
+
 class Post(models.Model):
     """Модель публикации."""
 
@@ -28,6 +51,8 @@ class Post(models.Model):
         help_text='введите текст поста'
     )
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name='дата')
+    # Версия публикации в ключе кэша ее карточки
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='изменена')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -45,14 +70,34 @@ class Post(models.Model):
         verbose_name='картинка',
         help_text='выберите графический файл',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        # Файл удаляется, когда на него не осталось ссылок (posts.images)
+        db_index=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         default_related_name = 'posts'
         verbose_name = 'публикацию'  # accusative
         verbose_name_plural = 'публикации'
+        # Ленты сортируются по (pub_date, id) после фильтра по автору
+        # или группе: posts.plans проверяет, что индексы используются
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -77,11 +122,19 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True, verbose_name='дата')
 
+    objects = BaseQuerySet.as_manager()
+
     class Meta:
         ordering = ('created',)
         default_related_name = 'comments'
         verbose_name = 'комментарий'  # nominative
         verbose_name_plural = 'комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -103,6 +156,8 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    objects = BaseQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'подписка'  # nominative
         verbose_name_plural = "подписки"
@@ -115,6 +170,82 @@ class Follow(models.Model):
                 name='no_self_subscriptions'
             )
         ]
+        # Прямой порядок (user, author) покрывает уникальное ограничение
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class TimelineEntry(models.Model):
+    """Модель записи материализованной ленты подписок."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='подписчик',
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='публикация',
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date: лента читается по индексу без сортировки
+    pub_date = models.DateTimeField(verbose_name='дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'  # nominative
+        verbose_name_plural = 'записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Модель счетчиков пользователя.
+
+    Счетчики обновляются сигналами и пересчитываются командой
+    `rebuild_user_stats`.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='пользователь',
+        related_name='stats'
+    )
+    posts = models.PositiveIntegerField(default=0, verbose_name='публикаций')
+    comments = models.PositiveIntegerField(
+        default=0, verbose_name='комментариев'
+    )
+    follows = models.PositiveIntegerField(default=0, verbose_name='подписок')
+    followers = models.PositiveIntegerField(
+        default=0, verbose_name='подписчиков'
+    )
+
+    objects = BaseQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'статистика пользователя'  # nominative
+        verbose_name_plural = 'статистика пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts}'
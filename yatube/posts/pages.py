@@ -0,0 +1,143 @@
+"""Кэш готовых страниц для анонимных посетителей.
+
+Представление помечает ответ областями поколений (`posts.generations`),
+от которых зависит страница, функцией `tag_page`. Для GET-запросов без
+cookies `AnonymousPageCacheMiddleware` сохраняет такой ответ целиком,
+вместе со сжатой gzip копией, и отдает его, пока не сменилось поколение
+ни одной из областей. Запись, затронувшая область, увеличивает ее
+поколение сигналом, и устаревают только страницы с этой областью.
+
+Помеченные ответы получают заголовки для обратного прокси:
+`Surrogate-Key` с ключами областей и `Cache-Control` с `s-maxage` для
+анонимных запросов или `private` для остальных. Ответ из кэша
+повторяет все заголовки исходного ответа, кроме cookies и тех, что
+зависят от сжатия.
+"""
+
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .generations import get_generations, surrogate_key
+
+PAGE_KEY = 'posts:page:{digest}'
+# Заголовки, которые ответ из кэша выставляет сам
+OWN_HEADERS = {'content-length', 'content-encoding', 'etag', 'set-cookie'}
+
+
+def tag_page(response, *scopes, keys=None):
+    """Разрешает кэшировать ответ до смены поколений scopes.
+
+    keys — суррогатные ключи страницы, по умолчанию ключи областей.
+    """
+    response.cache_scopes = scopes
+    response.surrogate_keys = keys or [
+        surrogate_key(scope) for scope in scopes
+    ]
+    return response
+
+
+def patch_proxy_headers(request, response):
+    response['Surrogate-Key'] = ' '.join(response.surrogate_keys)
+    if _cacheable_request(request) and not response.cookies:
+        response['Cache-Control'] = (
+            f'public, max-age=0, s-maxage={settings.PROXY_CACHE_TIMEOUT}'
+        )
+    else:
+        response['Cache-Control'] = 'private'
+
+
+def _page_key(request):
+    # Полный адрес со схемой и хостом: разные сайты и http/https не
+    # делят страницы, а недопустимый Host дает DisallowedHost и до кэша
+    # не доходит
+    return PAGE_KEY.format(digest=hashlib.md5(
+        request.build_absolute_uri().encode()
+    ).hexdigest())
+
+
+def _cacheable_request(request):
+    return request.method in ('GET', 'HEAD') and not request.COOKIES
+
+
+def _cacheable_response(response):
+    return (
+        getattr(response, 'cache_scopes', None)
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def _accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдает и сохраняет страницы анонимных посетителей.
+
+    Стоит первым в MIDDLEWARE: ответ из кэша не проходит сессии,
+    аутентификацию и представление, а сохраняется ответ уже с
+    заполненными метками `posts.holes`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if _cacheable_request(request):
+            page = cache.get(_page_key(request))
+            if page and (
+                get_generations(*page['scopes']) == page['generations']
+            ):
+                return self.cached_response(request, page)
+        response = self.get_response(request)
+        if getattr(response, 'cache_scopes', None):
+            patch_proxy_headers(request, response)
+        if (
+            _cacheable_request(request) and request.method == 'GET'
+            and _cacheable_response(response)
+        ):
+            # Повторные запросы получат сжатую копию
+            patch_vary_headers(response, ('Accept-Encoding',))
+            cache.set(_page_key(request), {
+                'scopes': response.cache_scopes,
+                'generations': get_generations(*response.cache_scopes),
+                'content_type': response['Content-Type'],
+                'etag': response.get('ETag'),
+                # Все заголовки, включая заголовки защиты от
+                # SecurityMiddleware и XFrameOptionsMiddleware
+                'headers': {
+                    header: value for header, value in response.items()
+                    if header.lower() not in OWN_HEADERS
+                },
+                'content': response.content,
+                'gzip': gzip.compress(response.content),
+            }, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def cached_response(self, request, page):
+        response = HttpResponse(content_type=page['content_type'])
+        for header, value in page['headers'].items():
+            response[header] = value
+        if _accepts_gzip(request):
+            response.content = page['gzip']
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response.content = page['content']
+        response['Content-Length'] = len(response.content)
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        etag = page['etag']
+        if etag is None:
+            return response
+        # Сжатая копия не совпадает с исходной побайтно
+        response['ETag'] = (
+            f'W/{etag}' if response.has_header('Content-Encoding') else etag
+        )
+        return get_conditional_response(
+            request, etag=response['ETag'], response=response
+        )
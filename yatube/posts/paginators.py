@@ -0,0 +1,210 @@
+"""Пагинаторы лент публикаций."""
+
+import datetime
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.caching import get_or_build
+
+POST_KEYS = ('pub_date', 'pk')
+COMMENT_KEYS = ('created', 'pk')
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды, иначе записи с близкими датами теряются."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(obj, keys=POST_KEYS) -> str:
+    """Непрозрачный курсор из значений ключей объекта."""
+    return urlsafe_base64_encode(force_bytes(json.dumps(
+        [getattr(obj, key) for key in keys], cls=CursorEncoder
+    )))
+
+
+def decode_cursor(token: str, keys=POST_KEYS):
+    """Значения ключей из курсора или None для испорченного курсора.
+
+    Первый ключ — дата с часовым поясом, остальные — целые числа.
+    """
+    try:
+        values = json.loads(urlsafe_base64_decode(token).decode())
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    moment, *numbers = values
+    try:
+        moment = parse_datetime(moment)
+    except (TypeError, ValueError):
+        return None
+    if moment is None or timezone.is_naive(moment):
+        return None
+    if not all(
+        isinstance(number, int) and not isinstance(number, bool)
+        for number in numbers
+    ):
+        return None
+    return [moment, *numbers]
+
+
+def _lexicographic(keys, values, lookup):
+    (first, *rest), (head, *tail) = keys, values
+    condition = Q(**{f'{first}__{lookup}': head})
+    if rest:
+        condition |= Q(**{first: head}) & _lexicographic(rest, tail, lookup)
+    return condition
+
+
+def keyset_condition(keys, values, lookup) -> Q:
+    """Условие `keys <lookup> values` в лексикографическом порядке."""
+    # Нестрогое условие на первый ключ задает диапазон для индекса
+    return Q(**{f'{keys[0]}__{lookup}e': values[0]}) & _lexicographic(
+        keys, values, lookup
+    )
+
+
+class KeysetPage(Page):
+    """Страница, ограниченная курсорами вместо номера."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, cursor,
+                 has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Page {self.cursor or "first"}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.object_list[-1], self.paginator.keys)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(self.object_list[0], self.paginator.keys)
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по убыванию ключей (по умолчанию `(pub_date, pk)`),
+    а при ascending=True — по возрастанию.
+
+    Стоимость страницы не зависит от глубины: вместо OFFSET запрос
+    ограничивается условием на значения ключей последней показанной записи.
+    Вместо QuerySet можно передать ленту с методом
+    `keyset_slice(values, reverse, limit)`.
+    """
+
+    def __init__(self, object_list, per_page, keys=POST_KEYS,
+                 ascending=False, **kwargs):
+        self.keys = keys
+        self.ascending = ascending
+        if isinstance(object_list, QuerySet):
+            object_list = object_list.order_by(*(
+                key if ascending else f'-{key}' for key in keys
+            ))
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_page(self, after=None, before=None):
+        """Страница после (более старые записи) или до курсора."""
+        for direction, token in (('before', before), ('after', after)):
+            values = decode_cursor(token, self.keys) if token else None
+            if values is not None:
+                return self._page(f'{direction}:{token}', values,
+                                  reverse=direction == 'before')
+        return self._page(None, None)
+
+    def _rows(self, values, reverse, limit):
+        if not isinstance(self.object_list, QuerySet):
+            return self.object_list.keyset_slice(values, reverse, limit)
+        query = self.object_list
+        forward, backward = ('gt', 'lt') if self.ascending else ('lt', 'gt')
+        if reverse:
+            query = query.reverse().filter(
+                keyset_condition(self.keys, values, backward)
+            )
+        elif values is not None:
+            query = query.filter(
+                keyset_condition(self.keys, values, forward)
+            )
+        return list(query[:limit])
+
+    def _page(self, cursor, values, reverse=False):
+        rows = self._rows(values, reverse, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse and not rows:
+            # Новее курсора ничего нет: показываем начало ленты
+            return self._page(None, None)
+        if reverse:
+            rows.reverse()
+            return KeysetPage(rows, self, cursor, True, has_more)
+        return KeysetPage(
+            rows, self, cursor, has_more, values is not None and bool(rows)
+        )
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, берущий число записей из кэша по ключу `count_key`.
+
+    При промахе кэша записи считаются не дальше порога
+    `POSTS_COUNT_THRESHOLD`: для больших лент число оценивается снизу,
+    а последняя доступная по номеру страница продолжается курсором.
+    Ключи сбрасываются сигналами при добавлении и удалении публикаций.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        self.count_key = count_key
+        self.continue_cursor = None
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        return get_or_build(
+            self.count_key, self._bounded_count,
+            settings.POSTS_COUNT_CACHE_TIMEOUT
+        )
+
+    def _bounded_count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        # values('pk') отбрасывает аннотации ленты из запроса подсчета
+        return self.object_list.values('pk')[
+            :settings.POSTS_COUNT_THRESHOLD + 1
+        ].count()
+
+    @property
+    def count_is_estimate(self):
+        return self.count > settings.POSTS_COUNT_THRESHOLD
+
+    def page(self, number):
+        page = super().page(number)
+        if self.count_is_estimate and not page.has_next() and len(page):
+            self.continue_cursor = encode_cursor(page[-1])
+        return page
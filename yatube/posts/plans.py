@@ -0,0 +1,98 @@
+"""Проверка планов запросов лент по индексам.
+
+Для каждого запроса представлений `posts.views` строится план
+`EXPLAIN QUERY PLAN` (SQLite). Запрос считается проблемным, если он
+читает таблицу полным просмотром без индекса или сортирует во временном
+B-дереве. Режим ленты подписок 'join' не проверяется: сортировка
+публикаций нескольких авторов в нем неизбежна.
+"""
+
+import datetime
+
+from django.db import NotSupportedError, connection
+from django.db.models.query import QuerySet
+
+from .models import Comment, Follow, Group, Post, TimelineEntry, User
+from .paginators import COMMENT_KEYS, POST_KEYS, keyset_condition
+from .services import get_feed
+from .timeline import TIMELINE_KEYS, get_timeline
+
+# Значения ключей курсора для планов: важна форма запроса, а не данные
+CURSOR_VALUES = (
+    datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc), 1
+)
+
+
+def explain(queryset: QuerySet) -> list:
+    """Строки плана запроса."""
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError('Планы проверяются только для SQLite')
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan) -> list:
+    """Шаги плана с полным просмотром таблицы или временной сортировкой."""
+    return [
+        step for step in plan
+        if 'TEMP B-TREE' in step or (
+            step.startswith('SCAN ') and ' USING ' not in step
+            and 'CONSTANT ROW' not in step
+        )
+    ]
+
+
+def _keyset_queries(name, feed, keys):
+    ordered = feed.order_by(*(f'-{key}' for key in keys))
+    return {
+        name: feed,
+        f'{name}: после курсора': ordered.filter(
+            keyset_condition(keys, CURSOR_VALUES, 'lt')
+        ),
+        f'{name}: до курсора': ordered.reverse().filter(
+            keyset_condition(keys, CURSOR_VALUES, 'gt')
+        ),
+        f'{name}: число записей': feed.values('pk'),
+    }
+
+
+def feed_queries() -> dict:
+    """Запросы представлений с ограничением размера страницы."""
+    user, group, post = User(pk=1), Group(pk=1), Post(pk=1)
+    queries = {}
+    for name, feed, keys in (
+        ('главная', get_feed(), POST_KEYS),
+        ('группа', get_feed(group=group), POST_KEYS),
+        ('профиль', get_feed(author=user), POST_KEYS),
+        ('лента подписок', get_timeline(user), TIMELINE_KEYS),
+    ):
+        queries.update(_keyset_queries(name, feed, keys))
+    queries.update({
+        'публикации автора': Post.objects.filter(author=user).order_by(
+            '-pub_date', '-pk'
+        ).values_list(*POST_KEYS),
+        'записи ленты': TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-post_id'
+        ).values_list('pub_date', 'post_id'),
+        'комментарии': Comment.objects.filter(post=post),
+        'комментарии: после курсора': Comment.objects.filter(
+            post=post
+        ).select_related('author').order_by(*COMMENT_KEYS).filter(
+            keyset_condition(COMMENT_KEYS, CURSOR_VALUES, 'gt')
+        ),
+        'подписка': Follow.objects.filter(user=user, author=user),
+        'подписчики': Follow.objects.filter(author=user).values('user_id'),
+    })
+    return {name: query[:10] for name, query in queries.items()}
+
+
+def audit() -> dict:
+    """Проблемные шаги планов по именам запросов."""
+    problems = {}
+    for name, query in feed_queries().items():
+        steps = plan_problems(explain(query))
+        if steps:
+            problems[name] = steps
+    return problems
@@ -1,12 +1,97 @@
 """Модуль вспомогательных функций"""
 
-from django.core.paginator import Paginator
+from django.core.paginator import Page
 from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
 
+from .models import Comment, Post
+from .paginators import (
+    COMMENT_KEYS, POST_KEYS, CachedCountPaginator, KeysetPaginator,
+)
 
-def get_posts_page(request: HttpRequest, query: QuerySet) -> Paginator.page:
-    return Paginator(
-        query, settings.POSTS_PER_PAGE
+FEED_COUNT_KEY = 'posts:count:{scope}'
+# Поля, которые читает карточка публикации posts/includes/post.html
+FEED_FIELDS = (
+    'text', 'pub_date', 'updated_at', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__title', 'group__slug',
+)
+PAGE_WINDOW_ON_EACH_SIDE = 2
+PAGE_WINDOW_ON_ENDS = 1
+
+
+def feed_count_key(scope: str, pk=None) -> str:
+    """Ключ кэша с числом публикаций ленты: index, group, author, follow."""
+    return FEED_COUNT_KEY.format(
+        scope=scope if pk is None else f'{scope}:{pk}'
+    )
+
+
+def get_feed(**filters) -> QuerySet:
+    """Публикации для ленты с авторами, группами и числом комментариев.
+
+    Страница такой ленты строится одним запросом независимо от числа
+    публикаций на ней. Публикации с одной датой упорядочены по ключу,
+    иначе страницы по номеру могли бы повторять и терять их.
+    """
+    comment_count = Comment.objects.filter(
+        post=OuterRef('pk')
+    ).order_by().values('post').annotate(count=Count('pk')).values('count')
+    return Post.objects.filter(**filters).select_related(
+        'author', 'group'
+    ).only(*FEED_FIELDS).annotate(comment_count=Coalesce(
+        Subquery(comment_count, output_field=IntegerField()), 0
+    )).order_by('-pub_date', '-pk')
+
+
+def get_posts_page(request: HttpRequest, query: QuerySet,
+                   keys=POST_KEYS, count_key: str = None) -> Page:
+    """Страница публикаций по номеру или по курсору.
+
+    Курсорный режим включается параметрами `after`/`before` в запросе
+    или настройкой `POSTS_PAGINATION = 'keyset'`.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before or settings.POSTS_PAGINATION == 'keyset':
+        return KeysetPaginator(
+            query, settings.POSTS_PER_PAGE, keys
+        ).get_page(after=after, before=before)
+    return CachedCountPaginator(
+        query, settings.POSTS_PER_PAGE, count_key=count_key
     ).get_page(request.GET.get('page', 1))
+
+
+def get_comments_page(post: Post, after: str = None) -> Page:
+    """Очередные `COMMENTS_PER_PAGE` комментариев публикации с авторами
+    в порядке написания, после курсора after."""
+    return KeysetPaginator(
+        Comment.objects.filter(post=post).select_related('author'),
+        settings.COMMENTS_PER_PAGE, COMMENT_KEYS, ascending=True
+    ).get_page(after=after)
+
+
+def get_page_window(page: Page, on_each_side: int = PAGE_WINDOW_ON_EACH_SIDE,
+                    on_ends: int = PAGE_WINDOW_ON_ENDS) -> list:
+    """Номера страниц вокруг текущей и по краям, None на месте пропуска.
+
+    Для 50 страниц и 25-й текущей: [1, None, 23, 24, 25, 26, 27, None, 50].
+    """
+    number, num_pages = page.number, page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    window = []
+    if number > on_each_side + on_ends + 2:
+        window += [*range(1, on_ends + 1), None]
+        window += range(number - on_each_side, number + 1)
+    else:
+        window += range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        window += range(number + 1, number + on_each_side + 1)
+        window += [None, *range(num_pages - on_ends + 1, num_pages + 1)]
+    else:
+        window += range(number + 1, num_pages + 1)
+    return window
@@ -0,0 +1,180 @@
+"""Обработчики сигналов моделей публикаций."""
+
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.purge import purge
+from core.tasks import run_in_background
+
+from . import merge, timeline
+from .generations import bump, expire_feeds
+from .images import release_later
+from .models import (
+    Comment, Follow, Group, Post, User, UserStats, posts_bulk_created,
+)
+from .services import feed_count_key
+from .stats import change_stats
+
+
+def reset_feed_counts(posts):
+    """Сбрасывает кэшированные числа публикаций в лентах с этими постами."""
+    authors = {post.author_id for post in posts}
+    keys = {feed_count_key('index')}
+    keys.update(feed_count_key('author', pk) for pk in authors)
+    keys.update(
+        feed_count_key('group', post.group_id)
+        for post in posts if post.group_id
+    )
+    # Ленты подписчиков авторов с подмешиванием не перебираются: их
+    # счетчики устаревают не дольше POSTS_COUNT_CACHE_TIMEOUT
+    keys.update(
+        feed_count_key('follow', pk) for pk in Follow.objects.filter(
+            author_id__in=authors - timeline.pull_authors(authors)
+        ).values_list('user_id', flat=True)
+    )
+    cache.delete_many(keys)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._old_group_id, instance._old_image = (
+        Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first() if instance.pk else None
+    ) or (None, '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        run_in_background(timeline.push_posts, [instance.pk])
+        merge.add_recent_post(instance)
+        change_stats(instance.author_id, posts=1)
+    if created or old_group_id != instance.group_id:
+        reset_feed_counts([instance])
+    if old_group_id and old_group_id != instance.group_id:
+        cache.delete(feed_count_key('group', old_group_id))
+    old_image = getattr(instance, '_old_image', '')
+    if old_image != instance.image.name:
+        release_later(old_image)
+    expire_feeds(
+        [instance.author_id], [old_group_id, instance.group_id],
+        [instance.pk]
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    reset_feed_counts([instance])
+    merge.remove_recent_post(instance)
+    change_stats(instance.author_id, posts=-1)
+    expire_feeds([instance.author_id], [instance.group_id], [instance.pk])
+    release_later(instance.image.name)
+
+
+@receiver(posts_bulk_created, sender=Post)
+def posts_created(sender, posts, **kwargs):
+    run_in_background(timeline.push_posts, [post.pk for post in posts])
+    reset_feed_counts(posts)
+    # Не все базы данных возвращают ключи из bulk_create
+    merge.forget_recent_posts(
+        {post.author_id for post in posts if post.pk is None}
+    )
+    for post in posts:
+        if post.pk is not None:
+            merge.add_recent_post(post)
+    for author_id, count in Counter(
+        post.author_id for post in posts
+    ).items():
+        change_stats(author_id, posts=count)
+    expire_feeds(
+        {post.author_id for post in posts}, {post.group_id for post in posts}
+    )
+
+
+def expire_commented(comment):
+    """Число комментариев показывается в карточке публикации, а число
+    комментариев автора — в его профиле."""
+    post = Post.objects.filter(pk=comment.post_id).values(
+        'author_id', 'group_id'
+    ).first() or {'author_id': None, 'group_id': None}
+    expire_feeds(
+        {comment.author_id, post['author_id']} - {None}, [post['group_id']],
+        [comment.post_id]
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, comments=1)
+        expire_commented(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_stats(instance.author_id, comments=-1)
+    expire_commented(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.follow_added(instance.user_id, instance.author_id)
+        change_stats(instance.user_id, follows=1)
+        change_stats(instance.author_id, followers=1)
+    merge.forget_following(instance.user_id)
+    cache.delete(feed_count_key('follow', instance.user_id))
+    bump(f'author:{instance.user_id}', f'author:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.follow_removed(instance.user_id, instance.author_id)
+    change_stats(instance.user_id, follows=-1)
+    change_stats(instance.author_id, followers=-1)
+    merge.forget_following(instance.user_id)
+    cache.delete(feed_count_key('follow', instance.user_id))
+    bump(f'author:{instance.user_id}', f'author:{instance.author_id}')
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._old_slug = (
+        Group.objects.filter(pk=instance.pk).values_list(
+            'slug', flat=True
+        ).first() if instance.pk else None
+    )
+
+
+@receiver((post_save, post_delete), sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.delete(feed_count_key('group', instance.pk))
+    bump('index', f'group:{instance.pk}', 'groups')
+    purge(*{
+        f'group-{slug}'
+        for slug in (instance.slug, getattr(instance, '_old_slug', None))
+        if slug
+    })
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        cache.delete_many([
+            feed_count_key('author', instance.pk),
+            feed_count_key('follow', instance.pk),
+        ])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # Вход пользователя сохраняет только last_login
+    if created or update_fields == frozenset(['last_login']):
+        return
+    bump('index', f'author:{instance.pk}', 'users')
@@ -0,0 +1,66 @@
+"""Денормализованные счетчики пользователей."""
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+# Счетчик и запрос, по которому он пересчитывается
+STATS_SOURCES = {
+    'posts': (Post, 'author'),
+    'comments': (Comment, 'author'),
+    'follows': (Follow, 'user'),
+    'followers': (Follow, 'author'),
+}
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def rebuild_stats(user_ids) -> list:
+    """Пересчитывает счетчики пользователей по базе данных.
+
+    Счетчики считаются и записываются одним UPDATE с подзапросами:
+    изменения `change_stats()` во время пересчета не теряются.
+    """
+    with transaction.atomic():
+        UserStats.objects.bulk_create(
+            [
+                UserStats(user_id=pk) for pk in User.objects.filter(
+                    pk__in=user_ids
+                ).values_list('pk', flat=True)
+            ],
+            ignore_conflicts=True
+        )
+        UserStats.objects.filter(user_id__in=user_ids).update(**{
+            name: _count(model, field)
+            for name, (model, field) in STATS_SOURCES.items()
+        })
+        return list(UserStats.objects.filter(user_id__in=user_ids))
+
+
+def change_stats(user_id, **deltas):
+    """Изменяет счетчики пользователя на deltas одним запросом.
+
+    Отсутствующая запись не создается: при каскадном удалении
+    пользователя она появилась бы для удаляемой строки.
+    """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        # Разошедшийся счетчик не уходит ниже нуля
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    })
+
+
+def get_user_stats(user) -> UserStats:
+    """Счетчики пользователя; отсутствующая запись создается."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return rebuild_stats([user.pk])[0]
@@ -0,0 +1,77 @@
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from core.caching import get_or_build
+
+from ..cards import render_cards
+from ..generations import get_generations
+
+register = template.Library()
+
+
+class GenerationCacheNode(template.Node):
+
+    def __init__(self, nodelist, fragment_name, scopes, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.scopes = scopes
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scopes = [
+            scope.resolve(context) if name is None
+            else f'{name}:{scope.resolve(context)}'
+            for name, scope in self.scopes
+        ]
+        # Области различают фрагменты (группу, автора), поколения —
+        # версия фрагмента: после записи его перестраивает один процесс,
+        # а не все запросы разом
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [*scopes, *(var.resolve(context) for var in self.vary_on)]
+        )
+        return get_or_build(
+            key, lambda: self.nodelist.render(context),
+            settings.FRAGMENT_CACHE_TIMEOUT, get_generations(*scopes)
+        )
+
+
+@register.tag
+def generation_cache(parser, token):
+    """Фрагмент, который кэшируется до смены поколения его областей.
+
+    {% generation_cache имя 'index' group=group.pk by page_obj.number %}
+    ...
+    {% endgeneration_cache %}
+
+    Области — строки или пары `имя=значение`, после `by` — значения,
+    от которых еще зависит фрагмент.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает имя фрагмента и хотя бы одну область'
+        )
+    nodelist = parser.parse(('endgeneration_cache',))
+    parser.delete_first_token()
+    scopes, vary_on = [], []
+    for bit in bits[2:]:
+        if bit == 'by' or vary_on:
+            vary_on.append(bit)
+        elif '=' in bit:
+            name, value = bit.split('=', 1)
+            scopes.append((name, parser.compile_filter(value)))
+        else:
+            scopes.append((None, parser.compile_filter(bit)))
+    return GenerationCacheNode(
+        nodelist, bits[1], scopes,
+        [parser.compile_filter(bit) for bit in vary_on[1:]]
+    )
+
+
+@register.simple_tag
+def post_cards(posts, **options):
+    """Карточки публикаций страницы из кэша."""
+    return [mark_safe(card) for card in render_cards(list(posts), **options)]
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..holes import punch
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, *args):
+    """Метка персональной части страницы, см. posts.holes."""
+    return mark_safe(punch(name, *args))
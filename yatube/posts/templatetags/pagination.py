@@ -0,0 +1,11 @@
+from django import template
+
+from ..services import get_page_window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj):
+    """Компактный набор номеров страниц для includes/paginator.html."""
+    return get_page_window(page_obj)
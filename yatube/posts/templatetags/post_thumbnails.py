@@ -0,0 +1,12 @@
+from django import template
+
+from ..thumbnails import get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size):
+    """Готовая миниатюра из POST_THUMBNAILS или None, см. posts.thumbnails.
+    """
+    return get_ready_thumbnail(image, size)
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..cards import card_key, render_cards
+from ..models import Group, Post, User
+from ..services import get_feed
+
+USERNAME_AUTHOR = 'author'
+USERNAME_OTHER = 'other'
+GROUP = {'title': 'Группа', 'slug': 'group', 'description': 'описание'}
+
+
+class TestPostCards(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.other = User.objects.create_user(USERNAME_OTHER)
+        cls.group = Group.objects.create(**GROUP)
+        cls.author = Client()
+        cls.author.force_login(user=cls.author_user)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author_user, group=cls.group
+        )
+        cls.other_post = Post.objects.create(text='Другой', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+
+    def keys(self):
+        return {post.pk: card_key(post) for post in get_feed()}
+
+    def test_cards_cached(self):
+        """Карточки страницы берутся из кэша"""
+        posts = list(get_feed())
+        cards = render_cards(posts)
+        cache.set_many({card_key(post): 'card' for post in posts})
+        self.assertNotEqual(cards, ['card', 'card'])
+        self.assertEqual(render_cards(posts), ['card', 'card'])
+
+    def test_edit_expires_one_card(self):
+        """Правка публикации меняет ключ только ее карточки"""
+        keys = self.keys()
+        self.author.post(
+            reverse('posts:post_edit', args=(self.post.pk,)),
+            data={'text': 'Исправленный пост', 'group': self.group.pk}
+        )
+        new_keys = self.keys()
+        self.assertNotEqual(keys[self.post.pk], new_keys[self.post.pk])
+        self.assertEqual(
+            keys[self.other_post.pk], new_keys[self.other_post.pk]
+        )
+
+    def test_rename_expires_cards(self):
+        """Переименование автора и группы меняет ключи их карточек"""
+        for obj, field in [(self.other, 'first_name'), (self.group, 'title')]:
+            with self.subTest(field=field):
+                keys = self.keys()
+                type(obj).objects.filter(pk=obj.pk).update(**{field: 'Имя'})
+                new_keys = self.keys()
+                self.assertEqual(
+                    keys[self.post.pk] == new_keys[self.post.pk],
+                    obj == self.other
+                )
+                self.assertEqual(
+                    keys[self.other_post.pk] == new_keys[self.other_post.pk],
+                    obj == self.group
+                )
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+
+USERNAME_AUTHOR = 'author'
+USERNAME_READER = 'reader'
+GROUP = {'title': 'Группа', 'slug': 'group', 'description': 'описание'}
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', args=(GROUP['slug'],))
+PROFILE_URL = reverse('posts:profile', args=(USERNAME_AUTHOR,))
+FOLLOW_URL = reverse('posts:follow_index')
+
+
+class TestConditionalGet(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.reader_user = User.objects.create_user(USERNAME_READER)
+        cls.reader = Client()
+        cls.reader.force_login(user=cls.reader_user)
+        cls.group = Group.objects.create(**GROUP)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author_user, group=cls.group
+        )
+        cls.POST_URL = reverse('posts:post_detail', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        """Неизмененная страница отвечает 304 без отрисовки шаблонов"""
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_URL,
+                    FOLLOW_URL]:
+            with self.subTest(url=url):
+                etag = self.reader.get(url)['ETag']
+                response = self.reader.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_modified(self):
+        """Запись и подписка меняют ETag затронутых страниц"""
+        etags = {
+            url: self.reader.get(url)['ETag']
+            for url in [PROFILE_URL, FOLLOW_URL, self.POST_URL]
+        }
+        Follow.objects.create(user=self.reader_user, author=self.author_user)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.reader.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                ).status_code, 200)
+
+    def test_users_differ(self):
+        """ETag зависит от пользователя: кнопки правки у каждого свои"""
+        self.assertNotEqual(
+            self.client.get(INDEX_URL)['ETag'],
+            self.reader.get(INDEX_URL)['ETag']
+        )
+
+    def test_cached_page_not_modified(self):
+        """Страница из кэша для анонимов тоже отвечает 304"""
+        etag = self.client.get(INDEX_URL)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..holes import HOLE_MARK, fill_holes, punch
+from ..models import Follow, Post, User
+
+USERNAME_AUTHOR = 'author'
+USERNAME_FOLLOWER = 'follower'
+INDEX_URL = reverse('posts:index')
+PROFILE_URL = reverse('posts:profile', args=(USERNAME_AUTHOR,))
+UNFOLLOW_URL = reverse('posts:profile_unfollow', args=(USERNAME_AUTHOR,))
+
+
+class TestHoles(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.follower_user = User.objects.create_user(USERNAME_FOLLOWER)
+        cls.author = Client()
+        cls.author.force_login(user=cls.author_user)
+        cls.follower = Client()
+        cls.follower.force_login(user=cls.follower_user)
+        cls.post = Post.objects.create(text='Пост', author=cls.author_user)
+        cls.EDIT_URL = reverse('posts:post_edit', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_shared_fragment_personalized(self):
+        """Общий фрагмент показывает кнопку правки только автору"""
+        for client, visible in [
+            (self.client, False), (self.follower, False), (self.author, True)
+        ]:
+            with self.subTest(user=client):
+                response = client.get(INDEX_URL)
+                self.assertNotIn(HOLE_MARK, response.content)
+                self.assertEqual(self.EDIT_URL in response.content.decode(),
+                                 visible)
+
+    def test_follow_button(self):
+        """Кнопка подписки зависит от подписки пользователя"""
+        Follow.objects.create(user=self.follower_user, author=self.author_user)
+        self.assertContains(self.follower.get(PROFILE_URL), UNFOLLOW_URL)
+        for client in [self.client, self.author]:
+            with self.subTest(user=client):
+                self.assertNotContains(client.get(PROFILE_URL), UNFOLLOW_URL)
+
+    def test_fill_holes(self):
+        """Метка заменяется содержимым, остальной текст не меняется"""
+        request = self.author.get(INDEX_URL).wsgi_request
+        content = fill_holes(
+            f'<p>{punch("edit", self.post.pk, self.author_user.pk)}</p>',
+            request
+        )
+        self.assertTrue(content.startswith('<p>'))
+        self.assertIn(self.EDIT_URL, content)
@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageSequence, PngImagePlugin
+
+from ..forms import PostForm
+from ..images import release, webp_name
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_ORIENTATION = 0x0112
+
+
+def make_upload(name, size, mode='RGB', image_format='JPEG', color='red',
+                **options):
+    output = BytesIO()
+    Image.new(mode, size, color).save(output, image_format, **options)
+    return SimpleUploadedFile(name, output.getvalue(), 'image/jpeg')
+
+
+def exif_rotated():
+    """EXIF: снимок повернут, повернуть при показе на 90° по часовой."""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    return exif
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=100)
+class TestImageIngestion(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def save(self, upload):
+        form = PostForm({'text': 'Пост'}, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.author
+        post.save()
+        return post
+
+    def errors(self, upload):
+        form = PostForm({'text': 'Пост'}, {'image': upload})
+        self.assertFalse(form.is_valid())
+        return form.errors['image']
+
+    def test_downscaled_without_metadata(self):
+        """Большой снимок уменьшается, поворачивается по EXIF и
+        сохраняется без метаданных"""
+        post = self.save(make_upload(
+            'photo.jpeg', (400, 200), exif=exif_rotated()
+        ))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn('exif', image.info)
+
+    def test_transparency_kept(self):
+        """Картинка с прозрачностью пережимается в PNG"""
+        post = self.save(make_upload(
+            'logo.png', (300, 300), 'RGBA', 'PNG'
+        ))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.size, (100, 100))
+
+    def test_png_text_removed(self):
+        """Текстовые блоки PNG удаляются и у небольшой картинки"""
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Author', 'Автор')
+        text.add_itxt('parameters', 'prompt')
+        post = self.save(make_upload(
+            'art.png', (80, 40), 'RGBA', 'PNG', pnginfo=text,
+            exif=exif_rotated()
+        ))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.text, {})
+            self.assertNotIn('exif', image.info)
+
+    def test_animation_downscaled(self):
+        """Анимация уменьшается покадрово, сохраняя формат и задержки,
+        и теряет метаданные"""
+        frames = [Image.new('RGB', (300, 200), color)
+                  for color in ('red', 'blue', 'green')]
+        output = BytesIO()
+        frames[0].save(
+            output, 'GIF', save_all=True, append_images=frames[1:],
+            duration=[100, 200, 300], loop=0, comment=b'secret'
+        )
+        post = self.save(SimpleUploadedFile(
+            'anim.gif', output.getvalue(), 'image/gif'
+        ))
+        self.assertTrue(post.image.name.endswith('.gif'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 67))
+            self.assertEqual(image.n_frames, 3)
+            self.assertNotIn('comment', image.info)
+            self.assertEqual(
+                [frame.info['duration']
+                 for frame in ImageSequence.Iterator(image)],
+                [100, 200, 300]
+            )
+
+    def test_small_image_unchanged(self):
+        """Небольшая картинка без метаданных сохраняется как есть"""
+        upload = make_upload('small.jpg', (80, 40))
+        post = self.save(upload)
+        upload.seek(0)
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), upload.read())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_file_size_limit(self):
+        """Слишком большой файл отклоняется"""
+        self.assertIn(
+            'Файл больше 0 МБ',
+            self.errors(make_upload('photo.jpg', (80, 40)))
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_pixel_limit(self):
+        """Картинка с большим числом пикселей отклоняется до
+        декодирования"""
+        self.assertIn(
+            'Картинка больше 1 мегапикселей',
+            self.errors(make_upload('huge.png', (2000, 1000), 'L', 'PNG'))
+        )
+
+    def test_webp_variant(self):
+        """Вместе с миниатюрами строится WebP-вариант картинки"""
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'image': make_upload('photo.jpg', (80, 40))}
+        )
+        post = Post.objects.get()
+        with post.image.storage.open(webp_name(post.image.name)) as file:
+            with Image.open(file) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (80, 40))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_RELEASE_DELAY=0)
+class TestImageStorage(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def create(self, color='red'):
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост',
+            'image': make_upload('photo.jpg', (80, 40), color=color),
+        })
+        return Post.objects.latest('pk')
+
+    def test_shared_until_unreferenced(self):
+        """Одинаковые загрузки делят файл, который удаляется вместе с
+        вариантом после удаления последней публикации"""
+        first, second = self.create(), self.create()
+        self.assertEqual(first.image.name, second.image.name)
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(webp_name(path)))
+
+    def test_replaced_image_released(self):
+        """Замененная при редактировании картинка удаляется"""
+        post = self.create()
+        path = post.image.path
+        self.client.post(reverse('posts:post_edit', args=(post.pk,)), {
+            'text': 'Пост',
+            'image': make_upload('photo.jpg', (80, 40), color='blue'),
+        })
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.path, path)
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(POST_IMAGE_RELEASE_DELAY=60)
+    def test_recent_upload_kept(self):
+        """Файл, загруженный недавно, не удаляется: ссылка на него может
+        быть еще не зафиксирована"""
+        post = self.create()
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertFalse(release(post.image.name))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_cleanup_command(self):
+        """Команда удаляет файлы без ссылок и оставляет используемые"""
+        kept = self.create()
+        orphan = self.create(color='blue')
+        Post.objects.filter(pk=orphan.pk).update(image='')
+        out = StringIO()
+        call_command('cleanup_images', stdout=out)
+        self.assertIn('Проверено файлов: 2, удалено: 1', out.getvalue())
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertTrue(os.path.exists(webp_name(kept.image.path)))
+        self.assertFalse(os.path.exists(orphan.image.path))
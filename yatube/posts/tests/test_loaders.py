@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.loaders import IdentityMapMiddleware
+
+from ..models import Comment, Post, User
+
+
+def in_request(func):
+    """Выполняет func как представление под IdentityMapMiddleware."""
+    return IdentityMapMiddleware(lambda request: func())(None)
+
+
+class TestBatchLoading(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.readers = [
+            User.objects.create_user(f'reader{i}') for i in range(3)
+        ]
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, count):
+        Comment.objects.bulk_create(
+            Comment(
+                text=f'Ответ {i}', post=self.post,
+                author=self.readers[i % len(self.readers)]
+            ) for i in range(count)
+        )
+
+    def authors(self):
+        post = Post.objects.select_related('author').get(pk=self.post.pk)
+        return [comment.author for comment in post.comments.all()]
+
+    def test_one_query_per_model(self):
+        """Авторы всех комментариев загружаются одним запросом"""
+        self.comment(6)
+        Comment.objects.create(
+            text='Ответ', post=self.post, author=self.author
+        )
+        with self.assertNumQueries(3):
+            authors = in_request(self.authors)
+        self.assertEqual(authors, [*self.readers * 2, self.author])
+        self.assertIs(authors[0], authors[3])
+
+    def test_outside_request(self):
+        """Вне запроса связи загружаются по одной"""
+        self.comment(3)
+        with self.assertNumQueries(5):
+            self.authors()
+
+    def test_post_page(self):
+        """Число запросов страницы не растет с числом комментариев"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.comment(3)
+        with CaptureQueriesContext(connection) as few:
+            Client().get(url)
+        cache.clear()
+        self.comment(12)
+        with CaptureQueriesContext(connection) as many:
+            response = Client().get(url)
+        self.assertEqual(len(many), len(few))
+        self.assertContains(response, 'reader2')
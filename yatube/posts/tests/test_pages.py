@@ -0,0 +1,143 @@
+import gzip
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.purge import get_purger
+
+from ..models import Comment, Group, Post, User
+
+USERNAME_AUTHOR = 'author'
+USERNAME_OTHER = 'other'
+GROUP = {'title': 'Группа', 'slug': 'group', 'description': 'описание'}
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', args=(GROUP['slug'],))
+PROFILE_URL = reverse('posts:profile', args=(USERNAME_AUTHOR,))
+OTHER_PROFILE_URL = reverse('posts:profile', args=(USERNAME_OTHER,))
+
+
+class TestAnonymousPageCache(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.other = User.objects.create_user(USERNAME_OTHER)
+        cls.author = Client()
+        cls.author.force_login(user=cls.author_user)
+        cls.group = Group.objects.create(**GROUP)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author_user, group=cls.group
+        )
+        cls.POST_URL = reverse('posts:post_detail', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page(self):
+        """Повторный анонимный запрос отдается из кэша без базы данных"""
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_URL]:
+            with self.subTest(url=url):
+                content = self.client.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.content, content)
+                compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(compressed['Content-Encoding'], 'gzip')
+                self.assertEqual(gzip.decompress(compressed.content), content)
+
+    def test_cached_headers(self):
+        """Ответ из кэша повторяет заголовки исходного ответа"""
+        for url in [INDEX_URL, self.POST_URL]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    cached = self.client.get(url)
+                self.assertEqual(cached['X-Frame-Options'], 'SAMEORIGIN')
+                self.assertEqual(dict(cached.items()), dict(response.items()))
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.example'])
+    def test_key_includes_host_and_scheme(self):
+        """Страница кэшируется отдельно для каждого хоста и схемы, а
+        недопустимый Host не получает ответ из кэша"""
+        self.client.get(INDEX_URL)
+        for options in (
+            {'HTTP_HOST': 'other.example'},
+            {'secure': True},
+        ):
+            with self.subTest(**options):
+                self.assertIsNotNone(
+                    self.client.get(INDEX_URL, **options).context
+                )
+        self.assertEqual(
+            self.client.get(INDEX_URL, HTTP_HOST='evil.example').status_code,
+            400
+        )
+
+    def test_cookies_bypass_cache(self):
+        """Запросы с cookies не читают кэш страниц"""
+        self.client.get(INDEX_URL)
+        self.assertIsNotNone(self.author.get(INDEX_URL).context)
+
+    def test_targeted_purge(self):
+        """Запись сбрасывает только затронутые страницы"""
+        for url in [INDEX_URL, PROFILE_URL, OTHER_PROFILE_URL, self.POST_URL]:
+            self.client.get(url)
+        Comment.objects.create(
+            text='Комментарий', author=self.author_user, post=self.post
+        )
+        self.assertContains(self.client.get(self.POST_URL), 'Комментарий')
+        self.assertContains(self.client.get(INDEX_URL), 'Комментариев: 1')
+        self.assertContains(self.client.get(PROFILE_URL), 'Комментариев: 1')
+        with self.assertNumQueries(0):
+            self.client.get(OTHER_PROFILE_URL)
+
+
+class TestProxyHeaders(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.other = User.objects.create_user(USERNAME_OTHER)
+        cls.author = Client()
+        cls.author.force_login(user=cls.author_user)
+        cls.group = Group.objects.create(**GROUP)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author_user, group=cls.group
+        )
+        cls.POST_URL = reverse('posts:post_detail', args=(cls.post.pk,))
+        cls.COMMENT_URL = reverse('posts:add_comment', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_headers(self):
+        """Страницы несут суррогатные ключи и срок хранения для прокси"""
+        cases = [
+            [INDEX_URL, 'index'],
+            [GROUP_URL, f'group-{GROUP["slug"]} users'],
+            [PROFILE_URL, f'author-{self.author_user.pk} groups'],
+            [self.POST_URL, f'post-{self.post.pk} '
+                            f'author-{self.author_user.pk} users groups'],
+        ]
+        for url, keys in cases:
+            with self.subTest(url=url):
+                for _ in range(2):
+                    response = self.client.get(url)
+                    self.assertEqual(response['Surrogate-Key'], keys)
+                    self.assertIn('s-maxage', response['Cache-Control'])
+                self.assertEqual(
+                    self.author.get(url)['Cache-Control'], 'private'
+                )
+
+    @override_settings(PURGE_BACKEND='core.purge.LocalProxy')
+    def test_purge(self):
+        """Запись очищает в прокси только затронутые страницы одной пачкой"""
+        proxy = get_purger()
+        for url in [PROFILE_URL, OTHER_PROFILE_URL, GROUP_URL]:
+            proxy.get(self.client, url)
+        self.author.post(self.COMMENT_URL, {'text': 'Комментарий'})
+        self.assertEqual(len(proxy.purged), 1)
+        self.assertEqual(set(proxy.pages), {OTHER_PROFILE_URL})
@@ -0,0 +1,17 @@
+from django.test import TestCase
+
+from ..models import Post
+from ..plans import audit, explain, plan_problems
+
+
+class TestQueryPlans(TestCase):
+
+    def test_feeds_use_indexes(self):
+        """Запросы лент читают индексы без полного просмотра и сортировки"""
+        self.assertEqual(audit(), {})
+
+    def test_problems_detected(self):
+        """Сортировка по неиндексированной колонке считается проблемой"""
+        problems = plan_problems(explain(Post.objects.order_by('text')))
+        self.assertEqual(len(problems), 2)
+        self.assertIn('TEMP B-TREE', problems[-1])
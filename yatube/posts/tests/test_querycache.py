@@ -0,0 +1,95 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.querycache import cached_queries
+
+from ..models import Group, Post, TimelineEntry, User
+
+SLUG = 'group'
+GROUP_URL = reverse('posts:group_list', args=(SLUG,))
+
+
+class TestQueryCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.group = Group.objects.create(
+            title='Группа', slug=SLUG, description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_reads(self):
+        """Повторный запрос читается из кэша только при включенном кэше"""
+        with cached_queries():
+            Group.objects.get(slug=SLUG)
+            User.objects.get(username='author')
+            with self.assertNumQueries(0):
+                group = Group.objects.get(slug=SLUG)
+                User.objects.get(username='author')
+        self.assertEqual(group, self.group)
+        with self.assertNumQueries(1):
+            Group.objects.get(slug=SLUG)
+
+    def test_writes_expire(self):
+        """Сохранение, update и bulk_create делают результаты устаревшими"""
+        titles = Post.objects.values_list('text', flat=True)
+        with cached_queries():
+            self.assertEqual(list(titles.all()), ['Пост'])
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Правка'
+            post.save()
+            self.assertEqual(list(titles.all()), ['Правка'])
+            Post.objects.update(text='Обновление')
+            self.assertEqual(list(titles.all()), ['Обновление'])
+            Post.objects.bulk_create([Post(text='Новый', author=self.author)])
+            self.assertEqual(len(titles.all()), 2)
+
+    def test_related_tables_expire(self):
+        """Удаление группы обновляет публикации со ссылкой на нее"""
+        groups = Post.objects.values_list('group', flat=True)
+        with cached_queries():
+            self.assertEqual(list(groups.all()), [self.group.pk])
+            Group.objects.get(pk=self.group.pk).delete()
+            self.assertEqual(list(groups.all()), [None])
+
+    def test_user_changes_expire(self):
+        """Изменения пользователей видны в кэшированных запросах"""
+        with cached_queries():
+            User.objects.get(username='author')
+            author = User.objects.get(pk=self.author.pk)
+            author.first_name = 'Лев'
+            author.save()
+            self.assertEqual(
+                User.objects.get(username='author').first_name, 'Лев'
+            )
+
+    def test_untracked_tables(self):
+        """Запросы к таблицам без отслеживания не кэшируются"""
+        query = Post.objects.filter(timeline_entries__user=self.author)
+        with cached_queries():
+            list(query.all())
+            TimelineEntry.objects.create(
+                user=self.author, post=self.post, pub_date=self.post.pub_date
+            )
+            self.assertEqual(list(query.all()), [self.post])
+
+    def test_view(self):
+        """Повторная отрисовка страницы группы обходится меньшим числом
+        запросов"""
+        client = Client()
+        client.force_login(self.author)
+        with CaptureQueriesContext(connection) as first:
+            client.get(GROUP_URL)
+        with CaptureQueriesContext(connection) as second:
+            response = client.get(GROUP_URL)
+        self.assertLess(len(second), len(first))
+        self.assertContains(response, 'Пост')
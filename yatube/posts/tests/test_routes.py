@@ -18,6 +18,7 @@ class TestPostRouting(TestCase):
             f'/posts/{POST_ID}/': ('post_detail', (POST_ID,)),
             f'/posts/{POST_ID}/edit/': ('post_edit', (POST_ID,)),
             f'/posts/{POST_ID}/comment/': ('add_comment', (POST_ID,)),
+            f'/posts/{POST_ID}/comments/': ('post_comments', (POST_ID,)),
             '/create/': ('post_create', ()),
             '/follow/': ('follow_index', ()),
             f'/profile/{USERNAME}/follow/': ('profile_follow', (USERNAME,)),
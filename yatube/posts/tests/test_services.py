@@ -0,0 +1,22 @@
+from django.core.paginator import Paginator
+from django.test import SimpleTestCase
+
+from ..services import get_page_window
+
+
+class TestPageWindow(SimpleTestCase):
+
+    def test_page_window(self):
+        """Окно страниц содержит края, соседей текущей и пропуски"""
+        cases = [
+            [1, 1, [1]],
+            [7, 4, [1, 2, 3, 4, 5, 6, 7]],
+            [50, 1, [1, 2, 3, None, 50]],
+            [50, 5, [1, 2, 3, 4, 5, 6, 7, None, 50]],
+            [50, 25, [1, None, 23, 24, 25, 26, 27, None, 50]],
+            [50, 50, [1, None, 48, 49, 50]],
+        ]
+        for num_pages, number, expected in cases:
+            with self.subTest(num_pages=num_pages, number=number):
+                page = Paginator(range(num_pages), 1).page(number)
+                self.assertEqual(get_page_window(page), expected)
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User, UserStats
+from ..stats import rebuild_stats
+
+USERNAME_AUTHOR = 'author'
+USERNAME_READER = 'reader'
+PROFILE_URL = reverse('posts:profile', args=(USERNAME_AUTHOR,))
+STATS_FIELDS = ('posts', 'comments', 'follows', 'followers')
+
+
+class TestUserStats(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(USERNAME_AUTHOR)
+        cls.reader = User.objects.create_user(USERNAME_READER)
+        cls.client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, user):
+        return UserStats.objects.values_list(*STATS_FIELDS).get(user=user)
+
+    def test_signals(self):
+        """Счетчики следуют за публикациями, комментариями и подписками"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=self.author) for i in range(3)
+        ])
+        Comment.objects.create(text='Ответ', author=self.reader, post=post)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author), (4, 0, 0, 1))
+        self.assertEqual(self.stats(self.reader), (0, 1, 1, 0))
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author), (3, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
+
+    def test_rebuild(self):
+        """Команда исправляет разошедшиеся счетчики"""
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.update(posts=10, followers=5)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('rebuild_user_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author), (1, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
+
+    def test_rebuild_in_one_statement(self):
+        """Пересчет читает и записывает счетчики одним UPDATE, не затирая
+        изменения, сделанные между чтением и записью"""
+        Post.objects.create(text='Пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_stats([self.author.pk, self.reader.pk])
+        statements = [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertFalse(any(sql.startswith('DELETE') for sql in statements))
+        updates = [sql for sql in statements if sql.startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('COUNT', updates[0])
+        self.assertEqual(self.stats(self.author), (1, 0, 0, 0))
+
+    def test_profile(self):
+        """Профиль показывает счетчики из записи статистики"""
+        UserStats.objects.filter(user=self.author).update(comments=7)
+        response = self.client.get(PROFILE_URL)
+        self.assertEqual(response.context['stats'].comments, 7)
+        self.assertContains(response, 'Комментариев: 7')
@@ -0,0 +1,226 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import tasks
+
+from ..cards import render_cards
+from ..models import Post, User
+from ..thumbnails import (generate, generate_later, get_ready_thumbnail,
+                          prefetch_thumbnails, thumbnails_ready)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PLACEHOLDER = 'Картинка обрабатывается'
+TEST_IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestThumbnails(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def image(self, number=0):
+        # Файлы называются по содержимому: разные картинки — разные файлы
+        content = TEST_IMAGE[:-1] + b'\x00' * number + TEST_IMAGE[-1:]
+        return SimpleUploadedFile('image.gif', content, 'image/gif')
+
+    def test_generated_on_create(self):
+        """Создание публикации строит миниатюры всех размеров"""
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'image': self.image()}
+        )
+        post = Post.objects.get()
+        for size in settings.POST_THUMBNAILS:
+            with self.subTest(size=size):
+                thumbnail = get_ready_thumbnail(post.image, size)
+                self.assertIsNotNone(thumbnail)
+                self.assertTrue(thumbnail.exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(
+            response, get_ready_thumbnail(post.image, 'detail').url
+        )
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_placeholder(self):
+        """До построения миниатюр страницы показывают заглушку и не
+        строят миниатюры сами"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=self.image()
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(post.pk,)),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), PLACEHOLDER)
+        self.assertIsNone(get_ready_thumbnail(post.image, 'card'))
+        # Задача пула только строит миниатюры, кэши сбрасывает
+        # thumbnails_ready в поставившем ее процессе
+        built = generate(post.pk)
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            PLACEHOLDER)
+        thumbnails_ready(post.pk, built)
+        self.assertNotContains(
+            self.client.get(reverse('posts:index')), PLACEHOLDER
+        )
+
+    def test_missing_file(self):
+        """Публикация с пропавшим файлом картинки остается с заглушкой"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=self.image()
+        )
+        os.remove(post.image.path)
+        with self.assertLogs('posts.thumbnails', 'WARNING'):
+            generate(post.pk)
+        self.assertIsNone(get_ready_thumbnail(post.image, 'card'))
+
+    def test_batched_lookups(self):
+        """Миниатюры страницы ищутся одним запросом к хранилищу ключей"""
+        for i in range(3):
+            generate(Post.objects.create(
+                text=f'Пост {i}', author=self.author, image=self.image(i)
+            ).pk)
+        posts = list(Post.objects.all())
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            cards = render_cards(posts)
+        self.assertEqual(
+            len([
+                query for query in queries
+                if 'thumbnail_kvstore' in query['sql']
+            ]),
+            1
+        )
+        for post, card in zip(posts, cards):
+            self.assertIn(get_ready_thumbnail(post.image, 'card').url, card)
+        posts = list(Post.objects.all())
+        prefetch_thumbnails(posts, 'card')
+        with self.assertNumQueries(0):
+            for post in posts:
+                self.assertIsNotNone(get_ready_thumbnail(post.image, 'card'))
+
+    def warm(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'warm_thumbnails', '--workers=0', *args, stdout=out, stderr=err
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_warm(self):
+        """Команда строит недостающие миниатюры и пропускает готовые"""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, image=self.image(i)
+            )
+            for i in range(3)
+        ]
+        Post.objects.create(text='Без картинки', author=self.author)
+        generate(posts[0].pk)
+        out, err = self.warm('--chunk-size=2')
+        self.assertIn('Картинок: 3, уже готовы: 1', out)
+        self.assertIn(
+            f'построено миниатюр: {2 * len(settings.POST_THUMBNAILS)}', out
+        )
+        self.assertEqual(err, '')
+        for post in posts:
+            self.assertIsNotNone(get_ready_thumbnail(post.image, 'detail'))
+        out, _ = self.warm()
+        self.assertIn('Картинок: 3, уже готовы: 3', out)
+
+    def test_warm_resume_and_failures(self):
+        """Команда продолжает обход с сохраненной публикации и сообщает
+        об ошибках"""
+        first, second, third = (
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, image=self.image(i)
+            )
+            for i in range(3)
+        )
+        os.remove(third.image.path)
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'warm.checkpoint')
+        with open(checkpoint, 'w') as file:
+            file.write(str(first.pk))
+        out, err = self.warm(f'--checkpoint={checkpoint}')
+        self.assertIn(f'после публикации {first.pk}', out)
+        self.assertIn('Картинок: 2, уже готовы: 0', out)
+        self.assertIn('ошибок: 1', out)
+        self.assertIn(third.image.name, err)
+        self.assertIsNone(get_ready_thumbnail(first.image, 'card'))
+        self.assertIsNotNone(get_ready_thumbnail(second.image, 'card'))
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_TASKS_EAGER=False)
+class TestThumbnailsInPool(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.author = User.objects.create_user('author')
+        # Тестовая база в памяти не видна процессам spawn: пул процессов
+        # заменяется пулом потоков с тем же интерфейсом
+        patcher = mock.patch.object(
+            tasks, 'process_pool',
+            lambda max_workers: ThreadPoolExecutor(max_workers)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, tasks, '_process_executor', None)
+        self.addCleanup(setattr, tasks, '_executor', None)
+
+    def wait_for_tasks(self):
+        tasks._process_executor.shutdown()
+        tasks._get_executor().shutdown()
+
+    def test_caches_reset_after_task(self):
+        """Без EAGER задача строит миниатюры в пуле, а по ее результату
+        кэши с заглушкой сбрасываются в поставившем ее процессе"""
+        post = Post.objects.create(
+            text='Пост', author=self.author,
+            image=SimpleUploadedFile('image.gif', TEST_IMAGE, 'image/gif')
+        )
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            PLACEHOLDER)
+        with mock.patch(
+            'posts.thumbnails.thumbnails_ready', wraps=thumbnails_ready
+        ) as ready:
+            generate_later(post)
+            self.wait_for_tasks()
+        ready.assert_called_once_with(post.pk, len(settings.POST_THUMBNAILS))
+        self.assertNotContains(
+            self.client.get(reverse('posts:index')), PLACEHOLDER
+        )
@@ -0,0 +1,193 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..merge import MergedFeed, recent_posts
+from ..models import Follow, Post, TimelineEntry, User
+from ..timeline import get_follow_feed, pull_authors
+
+USERNAME_AUTHOR = 'author'
+USERNAME_OTHER = 'other'
+USERNAME_FOLLOWER = 'follower'
+FOLLOW_URL = reverse('posts:follow_index')
+UNFOLLOW_URL = reverse('posts:profile_unfollow', args=(USERNAME_AUTHOR,))
+URL_WITH_PAGE = '{url}?page={page}'
+
+
+class TestTimeline(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(USERNAME_AUTHOR)
+        cls.other = User.objects.create_user(USERNAME_OTHER)
+        cls.follower_user = User.objects.create_user(USERNAME_FOLLOWER)
+        cls.follower = Client()
+        cls.follower.force_login(user=cls.follower_user)
+        cls.old_post = Post.objects.create(text='Старый', author=cls.author)
+        Post.objects.create(text='Чужой', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        return list(self.follower.get(FOLLOW_URL).context['page_obj'])
+
+    def joined_feed(self):
+        return list(Post.objects.filter(
+            author__following__user=self.follower_user
+        ).order_by('-pub_date', '-pk'))
+
+    def test_backfill_and_push(self):
+        """Подписка заполняет ленту, новые публикации попадают в нее"""
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        self.assertEqual(self.feed(), [self.old_post])
+        new_post = Post.objects.create(text='Новый', author=self.author)
+        Post.objects.create(text='Еще чужой', author=self.other)
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(self.feed(), self.joined_feed())
+
+    def test_reset_after_push(self):
+        """Число публикаций и ETag ленты сбрасываются после записи в
+        ленты, а не только в сигнале до нее"""
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        pending = []
+        with mock.patch(
+            'posts.signals.run_in_background',
+            lambda func, *args: pending.append((func, args))
+        ):
+            Post.objects.create(text='Новый', author=self.author)
+        # Запрос между фиксацией и записью в ленты
+        response = self.follower.get(FOLLOW_URL)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        for func, args in pending:
+            func(*args)
+        response = self.follower.get(
+            FOLLOW_URL, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    def test_prune(self):
+        """Отписка очищает ленту от публикаций автора"""
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        self.follower.get(UNFOLLOW_URL)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower_user).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    def test_deleted_post(self):
+        """Удаленная публикация пропадает из ленты"""
+        Follow.objects.create(user=self.follower_user, author=self.author)
+        Post.objects.create(text='Новый', author=self.author).delete()
+        self.assertEqual(self.feed(), self.joined_feed())
+
+
+@override_settings(
+    TIMELINE_FANOUT_MAX_FOLLOWERS=1, AUTHOR_RECENT_POSTS=3, POSTS_PER_PAGE=4
+)
+class TestHybridTimeline(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(USERNAME_AUTHOR)
+        cls.other = User.objects.create_user(USERNAME_OTHER)
+        cls.follower_user = User.objects.create_user(USERNAME_FOLLOWER)
+        cls.fan_user = User.objects.create_user('fan')
+        cls.follower = Client()
+        cls.follower.force_login(user=cls.follower_user)
+
+    def setUp(self):
+        cache.clear()
+        for author in [self.star, self.other]:
+            Follow.objects.create(user=self.follower_user, author=author)
+        for i in range(5):
+            for author in [self.star, self.other]:
+                Post.objects.create(text=f'Пост {i}', author=author)
+
+    def joined_feed(self):
+        return list(Post.objects.filter(
+            author__following__user=self.follower_user
+        ).order_by('-pub_date', '-pk'))
+
+    def pages(self, **params):
+        page_obj = self.follower.get(FOLLOW_URL, params).context['page_obj']
+        posts = list(page_obj)
+        if getattr(page_obj, 'is_keyset', False) and page_obj.has_next():
+            return posts + self.pages(after=page_obj.next_cursor)
+        if not page_obj.has_next():
+            return posts
+        return posts + self.pages(page=page_obj.next_page_number())
+
+    def test_pull_author(self):
+        """Автор с большим числом подписчиков подмешивается при чтении"""
+        Follow.objects.create(user=self.fan_user, author=self.star)
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=self.star
+        ).exists())
+        new_post = Post.objects.create(text='Новый', author=self.star)
+        self.assertFalse(new_post.timeline_entries.exists())
+        feed, _ = get_follow_feed(self.follower_user)
+        self.assertIsInstance(feed, MergedFeed)
+        self.assertEqual(self.pages(), self.joined_feed())
+        with override_settings(POSTS_PAGINATION='keyset'):
+            self.assertEqual(self.pages(), self.joined_feed())
+
+    def test_two_pull_authors(self):
+        """Перевод одного автора не меняет признак другого"""
+        authors = {self.star.pk, self.other.pk}
+        self.assertEqual(pull_authors(authors), set())
+        Follow.objects.create(user=self.fan_user, author=self.star)
+        Follow.objects.create(user=self.fan_user, author=self.other)
+        self.assertEqual(pull_authors(authors), authors)
+        Follow.objects.filter(author=self.star, user=self.fan_user).delete()
+        self.assertEqual(pull_authors(authors), {self.other.pk})
+        self.assertEqual(self.pages(), self.joined_feed())
+
+    def test_demote_author(self):
+        """Автор, потерявший подписчиков, снова рассылается по лентам"""
+        fan = Follow.objects.create(user=self.fan_user, author=self.star)
+        Post.objects.create(text='Новый', author=self.star)
+        fan.delete()
+        feed, _ = get_follow_feed(self.follower_user)
+        self.assertNotIsInstance(feed, MergedFeed)
+        self.assertEqual(self.pages(), self.joined_feed())
+
+    @override_settings(FOLLOW_FEED='timeline')
+    def test_timeline_mode_fans_out(self):
+        """В режиме 'timeline' публикации рассылаются всем подписчикам
+        независимо от их числа"""
+        Follow.objects.create(user=self.fan_user, author=self.star)
+        self.assertEqual(pull_authors({self.star.pk}), set())
+        new_post = Post.objects.create(text='Новый', author=self.star)
+        self.assertEqual(new_post.timeline_entries.count(), 2)
+        self.assertEqual(self.pages(), self.joined_feed())
+
+    @override_settings(FOLLOW_FEED='merge')
+    def test_merge_feed(self):
+        """Слияние списков авторов совпадает с соединением"""
+        feed, _ = get_follow_feed(self.follower_user)
+        self.assertIsInstance(feed, MergedFeed)
+        self.assertEqual(self.pages(), self.joined_feed())
+        with override_settings(POSTS_PAGINATION='keyset'):
+            self.assertEqual(self.pages(), self.joined_feed())
+
+    def test_recent_posts_maintained(self):
+        """Списки последних публикаций обновляются без перестроения"""
+        recent_posts([self.other.pk])
+        new_post = Post.objects.create(text='Новый', author=self.other)
+        with self.assertNumQueries(0):
+            recent = recent_posts([self.other.pk])[self.other.pk]
+        self.assertEqual(recent[0], (new_post.pub_date, new_post.pk))
+        self.assertEqual(len(recent), 3)
+        new_post.delete()
+        self.assertEqual(
+            recent_posts([self.other.pk])[self.other.pk],
+            list(self.other.posts.order_by('-pub_date', '-pk').values_list(
+                'pub_date', 'pk'
+            )[:3])
+        )
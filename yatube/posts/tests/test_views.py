@@ -1,14 +1,21 @@
+import json
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib import auth
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 
-from ..models import User, Post, Group, Follow
+from ..models import Comment, User, Post, Group, Follow
+from ..templatetags import fragments
 
 TEMP_MEDIA_ROOT_FORMS = tempfile.mkdtemp(dir=settings.BASE_DIR)
 URL_WITH_PAGE = '{url}?page={page}'
@@ -40,6 +47,11 @@ ANOTHER_FOLLOW_URL = reverse('posts:profile_follow', args=(USERNAME_ANOTHER,))
 ANOTHER_UNFOLLOW_URL = reverse(
     'posts:profile_unfollow', args=(USERNAME_ANOTHER,)
 )
+# Ответ из кэша страниц не содержит контекста представления
+WITHOUT_PAGE_CACHE = [
+    name for name in settings.MIDDLEWARE
+    if name != 'posts.pages.AnonymousPageCacheMiddleware'
+]
 TEST_IMAGE = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -93,6 +105,252 @@ class TestPagination(TestCase):
                 )
 
 
+@override_settings(MIDDLEWARE=WITHOUT_PAGE_CACHE)
+class TestKeysetPagination(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.group = Group.objects.create(**GROUP)
+        # bulk_create дает публикации с одинаковыми датами: порядок
+        # внутри одной даты определяется идентификатором
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=cls.author_user, group=cls.group)
+            for i in range(POST_NUMBER)
+        ])
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def walk(self, url, page, direction):
+        """Страницы ленты, начиная с данной, в порядке обхода"""
+        pages = [list(page)]
+        param, cursor = {
+            'next': ('after', page.next_cursor),
+            'previous': ('before', page.previous_cursor),
+        }[direction]
+        if cursor is None:
+            return pages
+        return pages + self.walk(
+            url,
+            self.client.get(f'{url}?{param}={cursor}').context['page_obj'],
+            direction
+        )
+
+    @override_settings(POSTS_PAGINATION='keyset')
+    def test_keyset_pagination(self):
+        """Курсоры обходят ленту в обе стороны без пропусков и повторов"""
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertFalse(first.has_previous())
+                forward = self.walk(url, first, 'next')
+                self.assertEqual(
+                    [len(page) for page in forward],
+                    [POSTS_ON_FIRST_PAGE, POSTS_ON_LAST_PAGE]
+                )
+                self.assertEqual(sum(forward, []), self.expected)
+                last = self.client.get(
+                    f'{url}?after={first.next_cursor}'
+                ).context['page_obj']
+                backward = self.walk(url, last, 'previous')
+                self.assertEqual(sum(backward[::-1], []), self.expected)
+
+    def test_numbered_pages_with_equal_dates(self):
+        """Страницы по номеру обходят публикации с одной датой без
+        пропусков и повторов"""
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                pages = [
+                    list(self.client.get(URL_WITH_PAGE.format(
+                        url=url, page=page
+                    )).context['page_obj'])
+                    for page in range(1, LAST_PAGE + 1)
+                ]
+                self.assertEqual(sum(pages, []), self.expected)
+
+    def test_broken_cursor(self):
+        """Испорченный курсор открывает начало ленты"""
+        page = self.client.get(f'{INDEX_URL}?after=broken').context['page_obj']
+        self.assertEqual(list(page), self.expected[:POSTS_ON_PAGE_LIMIT])
+
+    @override_settings(FOLLOW_FEED='merge')
+    def test_cursor_with_bad_values(self):
+        """Курсор правильного вида с негодными значениями открывает
+        начало ленты"""
+        follower = User.objects.create_user(USERNAME_FOLLOWER)
+        Follow.objects.create(user=follower, author=self.author_user)
+        self.client.force_login(follower)
+        comments_url = reverse('posts:post_comments',
+                               args=(self.expected[0].pk,))
+        for values in (
+            ['x', 1],
+            [None, 1],
+            ['2020-01-01T00:00:00', 1],
+            ['2020-01-01T00:00:00+00:00', 'abc'],
+            ['2020-01-01T00:00:00+00:00', None],
+            ['2020-13-01T00:00:00+00:00', 1],
+        ):
+            token = urlsafe_base64_encode(force_bytes(json.dumps(values)))
+            for url in (INDEX_URL, FOLLOW_URL, comments_url):
+                with self.subTest(values=values, url=url):
+                    response = self.client.get(f'{url}?after={token}')
+                    self.assertEqual(response.status_code, 200)
+                    if url != comments_url:
+                        self.assertEqual(
+                            list(response.context['page_obj']),
+                            self.expected[:POSTS_ON_PAGE_LIMIT]
+                        )
+
+
+@override_settings(MIDDLEWARE=WITHOUT_PAGE_CACHE)
+class TestFeedCounts(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=cls.author_user)
+            for i in range(POST_NUMBER)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        """Число публикаций берется из кэша и сбрасывается при записи"""
+        self.assertEqual(
+            self.client.get(INDEX_URL).context['page_obj'].paginator.count,
+            POST_NUMBER
+        )
+        with self.assertNumQueries(1):
+            page_obj = self.client.get(INDEX_URL).context['page_obj']
+            self.assertEqual(len(page_obj), POSTS_ON_FIRST_PAGE)
+        Post.objects.create(text='Новый пост', author=self.author_user)
+        self.assertEqual(
+            self.client.get(INDEX_URL).context['page_obj'].paginator.count,
+            POST_NUMBER + 1
+        )
+
+    @override_settings(POSTS_COUNT_THRESHOLD=POSTS_ON_PAGE_LIMIT)
+    def test_count_estimate(self):
+        """Выше порога лента считается приблизительно и листается курсором"""
+        page_obj = self.client.get(
+            URL_WITH_PAGE.format(url=INDEX_URL, page=LAST_PAGE)
+        ).context['page_obj']
+        self.assertTrue(page_obj.paginator.count_is_estimate)
+        self.assertEqual(page_obj.number, 2)
+        cursor = page_obj.paginator.continue_cursor
+        self.assertIsNotNone(cursor)
+        self.assertEqual(
+            len(self.client.get(f'{INDEX_URL}?after={cursor}').context[
+                'page_obj'
+            ]),
+            POST_NUMBER - POSTS_ON_PAGE_LIMIT - 1
+        )
+
+
+@override_settings(MIDDLEWARE=WITHOUT_PAGE_CACHE, COMMENTS_PER_PAGE=3)
+class TestCommentPagination(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.post = Post.objects.create(author=cls.author_user, **POST)
+        # Одинаковые даты: порядок внутри даты задает идентификатор
+        Comment.objects.bulk_create([
+            Comment(text=f'Ответ {i}', author=cls.author_user, post=cls.post)
+            for i in range(8)
+        ])
+        cls.expected = list(Comment.objects.order_by('created', 'pk'))
+        cls.url = reverse('posts:post_detail', args=(cls.post.pk,))
+        cls.comments_url = reverse(
+            'posts:post_comments', args=(cls.post.pk,)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_load_more(self):
+        """Страница показывает первые комментарии, фрагменты — остальные
+        по порядку без пропусков и повторов"""
+        page = self.client.get(self.url).context['comments']
+        pages = [list(page)]
+        while page.has_next():
+            response = self.client.get(
+                f'{self.comments_url}?after={page.next_cursor}'
+            )
+            page = response.context['comments']
+            pages.append(list(page))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertNotContains(response, 'data-load-more')
+
+    def test_fragment_queries(self):
+        """Фрагмент загружает комментарии вместе с авторами"""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.comments_url)
+        self.assertContains(response, 'data-load-more')
+        self.assertNotContains(response, '<html')
+
+    def test_missing_post(self):
+        """Фрагмент несуществующей публикации не найден"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 1,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class TestFeedQueries(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author_user = User.objects.create_user(USERNAME_AUTHOR)
+        cls.follower_user = User.objects.create_user(USERNAME_FOLLOWER)
+        cls.follower = Client()
+        cls.follower.force_login(user=cls.follower_user)
+        cls.group = Group.objects.create(**GROUP)
+        Follow.objects.create(user=cls.follower_user, author=cls.author_user)
+
+    def add_posts(self, numbers):
+        for i in numbers:
+            author = User.objects.create_user(f'{USERNAME_ANOTHER}{i}')
+            group = Group.objects.create(title=f'{i}', slug=f'slug{i}')
+            for post_author, post_group in [
+                (author, group), (self.author_user, self.group)
+            ]:
+                post = Post.objects.create(
+                    text=f'Пост {i}', author=post_author, group=post_group
+                )
+                Comment.objects.create(
+                    text='Комментарий', author=author, post=post
+                )
+
+    def count_queries(self):
+        counts = []
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_URL]:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.follower.get(url)
+            counts.append(len(queries))
+        return counts
+
+    def test_feed_queries(self):
+        """Число запросов ленты не зависит от числа публикаций"""
+        self.add_posts(range(1))
+        few = self.count_queries()
+        self.add_posts(range(1, POSTS_ON_PAGE_LIMIT))
+        self.assertEqual(self.count_queries(), few)
+
+    def test_comment_count(self):
+        """Карточка ленты получает число комментариев"""
+        self.add_posts(range(1))
+        for post in self.client.get(INDEX_URL).context['page_obj']:
+            self.assertEqual(post.comment_count, 1)
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT_FORMS)
 class TestPostData(TestCase):
 
@@ -126,6 +384,10 @@ class TestPostData(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT_FORMS, ignore_errors=True)
 
+    def setUp(self):
+        # Откат транзакции теста не сбрасывает кэшированные счетчики
+        cache.clear()
+
     def test_post_context(self):
         """Публикация передается с правильными данными"""
         cases = [
@@ -180,15 +442,55 @@ class TestPostData(TestCase):
         self.assertEqual(user, self.author_user)
 
     def test_cache(self):
-        """Кэш главной страницы работает правильно"""
+        """Кэш главной страницы сбрасывается записью, а не по времени"""
         self.assertTrue(Post.objects.all().count())
         cache.clear()
         content = self.client.get(INDEX_URL).content
-        Post.objects.all().delete()
+        # update() не отправляет сигналов, и страница остается в кэше
+        Post.objects.update(text='Измененный текст')
         self.assertEqual(content, self.client.get(INDEX_URL).content)
-        cache.clear()
+        Post.objects.all().delete()
         self.assertNotEqual(content, self.client.get(INDEX_URL).content)
 
+    def test_fragments_expire(self):
+        """Записи сразу обновляют закэшированные ленты группы и автора"""
+        self.client.get(GROUP_URL)
+        self.client.get(PROFILE_URL)
+        Comment.objects.create(
+            text='Комментарий', author=self.author_user, post=self.post
+        )
+        self.assertContains(self.client.get(PROFILE_URL), 'Комментариев: 1')
+        self.assertContains(self.client.get(GROUP_URL), 'Комментариев: 1')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.client.get(PROFILE_URL), '#Новое название')
+
+    def test_fragments_per_group_and_author(self):
+        """У лент разных групп и авторов свои ключи фрагментов"""
+        Post.objects.create(
+            author=self.follower_user, group=self.group_other,
+            **POST_IN_OTHER_GROUP
+        )
+        follower_url = reverse('posts:profile', args=(USERNAME_FOLLOWER,))
+        pages = {
+            GROUP_URL: POST['text'],
+            GROUP_OTHER_URL: POST_IN_OTHER_GROUP['text'],
+            PROFILE_URL: POST['text'],
+            follower_url: POST_IN_OTHER_GROUP['text'],
+        }
+        keys = {}
+        for url in pages:
+            with mock.patch.object(
+                fragments, 'get_or_build', wraps=fragments.get_or_build
+            ) as get_or_build:
+                self.client.get(url)
+            keys[url] = get_or_build.call_args[0][0]
+        self.assertEqual(len(set(keys.values())), len(pages))
+        for url, text in pages.items():
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), text)
+
 
 class TestSubscription(TestCase):
 
@@ -0,0 +1,173 @@
+"""Миниатюры картинок публикаций.
+
+Размеры миниатюр задает `POST_THUMBNAILS`: имя — геометрия и параметры
+sorl-thumbnail. После сохранения публикации представление вызывает
+`generate_later()`, и все миниатюры вместе с WebP-вариантом картинки
+(`posts.images`) строятся в пуле процессов, не задерживая ответ и
+первого читателя. Шаблоны тегом `post_thumbnail`
+только читают готовую миниатюру из хранилища ключей sorl и до ее
+появления показывают заглушку. Когда миниатюры построены, публикацию
+сохраняет `thumbnails_ready()` в процессе, поставившем задачу: сигналы
+сбрасывают кэш ее карточки и страниц там, где он читается, а не в
+кэше процесса пула.
+
+Перед отрисовкой страницы `prefetch_thumbnails()` находит миниатюры всех
+ее публикаций одним `get_many` к кэшу хранилища ключей и одним запросом
+`IN` к его таблице, и тег берет результат из публикации.
+"""
+
+import logging
+from functools import partial
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from core.tasks import run_in_process
+
+from .images import save_webp
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру, не строя ее."""
+
+    def _full_options(self, source, options) -> dict:
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail: от них
+        # зависит имя файла миниатюры
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, построенной или нет."""
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._full_options(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+
+backend = ReadyThumbnailBackend()
+
+
+def _find_raw(raw_keys) -> dict:
+    """Значения хранилища ключей sorl: из кэша, остальные одним
+    запросом. Отсутствие миниатюры не кэшируется: ее строит другой
+    процесс."""
+    store = default.kvstore
+    if not isinstance(store, CachedDBStore):
+        return {key: store._get_raw(key) for key in raw_keys}
+    found = {
+        key: value for key, value in store.cache.get_many(raw_keys).items()
+        if isinstance(value, str)
+    }
+    missing = [key for key in raw_keys if key not in found]
+    if missing:
+        rows = dict(KVStore.objects.filter(key__in=missing).values_list(
+            'key', 'value'
+        ))
+        store.cache.set_many(rows, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(rows)
+    return found
+
+
+def find_thumbnails(pairs) -> dict:
+    """Готовые миниатюры по парам (картинка, размер из POST_THUMBNAILS),
+    None для еще не построенных."""
+    raw_keys = {}
+    for image, size in pairs:
+        geometry, options = settings.POST_THUMBNAILS[size]
+        thumbnail = backend.thumbnail_file(image, geometry, **options)
+        raw_keys[image.name, size] = add_prefix(thumbnail.key)
+    found = _find_raw(list(set(raw_keys.values())))
+    return {
+        pair: deserialize_image_file(found[key]) if found.get(key) else None
+        for pair, key in raw_keys.items()
+    }
+
+
+def prefetch_thumbnails(posts, *sizes):
+    """Находит миниатюры публикаций posts для тега `post_thumbnail`."""
+    posts = [post for post in posts if post.image]
+    found = find_thumbnails(
+        (post.image, size) for post in posts for size in sizes
+    )
+    for post in posts:
+        post.prefetched_thumbnails = {
+            size: found[post.image.name, size] for size in sizes
+        }
+
+
+def get_ready_thumbnail(image, size):
+    """Готовая миниатюра размера size из POST_THUMBNAILS или None."""
+    if not image:
+        return None
+    prefetched = getattr(image.instance, 'prefetched_thumbnails', {})
+    if size in prefetched:
+        return prefetched[size]
+    return find_thumbnails([(image, size)])[image.name, size]
+
+
+def build_thumbnails(post_id) -> int:
+    """Строит недостающие миниатюры и WebP-вариант картинки публикации и
+    возвращает число миниатюр. Нет файла картинки — FileNotFoundError."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return 0
+    if not post.image.storage.exists(post.image.name):
+        raise FileNotFoundError(post.image.name)
+    save_webp(post.image)
+    found = find_thumbnails(
+        (post.image, size) for size in settings.POST_THUMBNAILS
+    )
+    built = 0
+    for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+        if found[post.image.name, size] is None:
+            backend.get_thumbnail(post.image, geometry, **options)
+            built += 1
+    return built
+
+
+def thumbnails_ready(post_id, built):
+    """Сохраняет публикацию, для которой построены миниатюры: сигналы
+    сбрасывают кэши с заглушкой. Вызывается в процессе, чьи кэши
+    сбрасываются, а не в процессе пула."""
+    if not built:
+        return
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        post.save(update_fields=['updated_at'])
+
+
+def generate(post_id) -> int:
+    """Строит недостающие миниатюры картинки публикации и возвращает их
+    число."""
+    try:
+        return build_thumbnails(post_id)
+    except FileNotFoundError as error:
+        logger.warning('Нет файла картинки публикации %s: %s',
+                       post_id, error)
+        return 0
+
+
+def generate_later(post):
+    """Ставит построение миниатюр публикации в очередь пула процессов."""
+    if post.image:
+        run_in_process('posts.thumbnails.generate', post.pk,
+                       then=partial(thumbnails_ready, post.pk))
@@ -0,0 +1,218 @@
+"""Ленты подписок.
+
+Публикации обычных авторов записываются в ленты подписчиков при создании
+(fan-out on write), и страница ленты читается диапазоном индекса
+`(user, pub_date, post)` без соединения с подписками. Публикации авторов,
+у которых подписчиков больше `TIMELINE_FANOUT_MAX_FOLLOWERS`, не
+рассылаются: при чтении они подмешиваются к ленте из кэша последних
+публикаций автора (pull). Признак подмешивания хранится отдельным ключом
+кэша для каждого автора, и перевод одного автора не затирает
+состояние другого.
+
+Записи лент добавляются в пуле потоков уже после фиксации транзакции,
+поэтому число публикаций и поколение 'follow:<pk>' ленты подписчика
+сбрасываются после записи (`timelines_changed()`), а не в сигнале:
+иначе запрос в промежутке закэшировал бы старые число и ETag.
+
+Подмешивание работает только в режиме `FOLLOW_FEED = 'hybrid'`: в
+остальных режимах публикации рассылаются всем подписчикам независимо от
+их числа, и материализованная лента полна.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.db.models.query import QuerySet
+
+from core.tasks import run_in_background
+
+from .merge import (
+    AuthorSource, MergedFeed, QuerySource, following_ids, get_merged_feed,
+    recent_posts,
+)
+from .models import Follow, Post, TimelineEntry
+from .generations import bump
+from .paginators import POST_KEYS
+from .services import feed_count_key, get_feed
+
+# Ключи курсора ленты: колонки записи ленты, а не публикации
+TIMELINE_KEYS = ('feed_date', 'feed_id')
+FOLLOWERS_KEY = 'posts:followers:{author_id}'
+PULL_AUTHOR_KEY = 'posts:pull:{author_id}'
+
+
+def timelines_changed(user_ids):
+    """Сбрасывает число публикаций и поколение лент подписчиков."""
+    user_ids = set(user_ids)
+    cache.delete_many([feed_count_key('follow', pk) for pk in user_ids])
+    bump(*(f'follow:{pk}' for pk in user_ids))
+
+
+def push_posts(post_ids):
+    """Добавляет публикации в ленты подписчиков их авторов."""
+    posts = list(Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'author_id', 'pub_date'
+    ))
+    pull = pull_authors({author_id for _, author_id, _ in posts})
+    changed = set()
+    for post_id, author_id, pub_date in posts:
+        if author_id in pull:
+            continue
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post_id=post_id,
+                              pub_date=pub_date)
+                for user_id in followers
+            ],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        changed.update(followers)
+    timelines_changed(changed)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту подписчика публикациями нового автора."""
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in Post.objects.filter(
+                author_id=author_id
+            ).values_list('pk', 'pub_date').iterator()
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    timelines_changed([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика публикации автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    timelines_changed([user_id])
+
+
+def pull_authors(author_ids) -> set:
+    """Авторы из author_ids, публикации которых подмешиваются при
+    чтении. Признак, которого нет в кэше, определяется по числу
+    подписчиков."""
+    if settings.FOLLOW_FEED != 'hybrid':
+        return set()
+    keys = {
+        PULL_AUTHOR_KEY.format(author_id=author_id): author_id
+        for author_id in author_ids
+    }
+    flags = cache.get_many(keys)
+    missing = [author_id for key, author_id in keys.items()
+               if key not in flags]
+    if missing:
+        pull = set(Follow.objects.filter(author_id__in=missing).values(
+            'author_id'
+        ).annotate(followers=Count('pk')).filter(
+            followers__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        ).values_list('author_id', flat=True))
+        found = {
+            PULL_AUTHOR_KEY.format(author_id=author_id): author_id in pull
+            for author_id in missing
+        }
+        cache.set_many(found, None)
+        flags.update(found)
+    return {keys[key] for key, pull in flags.items() if pull}
+
+
+def _set_pull(author_id, pull):
+    cache.set(PULL_AUTHOR_KEY.format(author_id=author_id), pull, None)
+
+
+def _count_followers(author_id, delta):
+    """Число подписчиков автора после изменения на delta."""
+    key = FOLLOWERS_KEY.format(author_id=author_id)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        followers = Follow.objects.filter(author_id=author_id).count()
+        cache.set(key, followers, None)
+        return followers
+
+
+def promote(author_id):
+    """Переводит автора на подмешивание при чтении."""
+    _set_pull(author_id, True)
+    TimelineEntry.objects.filter(post__author_id=author_id).delete()
+
+
+def demote(author_id):
+    """Возвращает автора к рассылке по лентам подписчиков."""
+    for user_id in Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator():
+        backfill(user_id, author_id)
+    # Автор читается через pull, пока ленты не заполнены
+    _set_pull(author_id, False)
+
+
+def follow_added(user_id, author_id):
+    followers = _count_followers(author_id, 1)
+    if (
+        settings.FOLLOW_FEED == 'hybrid'
+        and followers == settings.TIMELINE_FANOUT_MAX_FOLLOWERS + 1
+    ):
+        run_in_background(promote, author_id)
+    elif author_id not in pull_authors([author_id]):
+        run_in_background(backfill, user_id, author_id)
+
+
+def follow_removed(user_id, author_id):
+    prune(user_id, author_id)
+    followers = _count_followers(author_id, -1)
+    if (
+        followers == settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        and author_id in pull_authors([author_id])
+    ):
+        run_in_background(demote, author_id)
+
+
+def get_timeline(user) -> QuerySet:
+    """Лента подписок пользователя из материализованной таблицы."""
+    return get_feed(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__post_id'),
+    ).order_by('-feed_date', '-feed_id')
+
+
+def get_hybrid_feed(user):
+    """Материализованная лента с подмешанными авторами с большим числом
+    подписчиков."""
+    pull = pull_authors(following_ids(user.pk))
+    if not pull:
+        return get_timeline(user), TIMELINE_KEYS
+    recent = recent_posts(pull)
+    return MergedFeed([
+        QuerySource(
+            TimelineEntry.objects.filter(user=user), ('pub_date', 'post_id')
+        ),
+        *(AuthorSource(author_id, recent[author_id]) for author_id in pull)
+    ]), POST_KEYS
+
+
+def get_follow_feed(user, mode=None):
+    """Лента подписок и ключи курсора для нее.
+
+    Режимы `FOLLOW_FEED`: 'join' — соединение с подписками при чтении,
+    'timeline' — только материализованная лента, 'hybrid' — материализованная
+    лента и подмешивание авторов с большим числом подписчиков, 'merge' —
+    слияние кэшированных списков публикаций всех авторов подписок.
+    """
+    mode = mode or settings.FOLLOW_FEED
+    if mode == 'join':
+        return get_feed(author__following__user=user), POST_KEYS
+    if mode == 'timeline':
+        return get_timeline(user), TIMELINE_KEYS
+    if mode == 'merge':
+        return get_merged_feed(user), POST_KEYS
+    return get_hybrid_feed(user)
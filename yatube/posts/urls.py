@@ -20,6 +20,9 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
@@ -2,48 +2,89 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.views.decorators.http import condition
 
+from core.querycache import cached_queries
+
+from . import conditions
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow, User
-from .services import get_posts_page
+from .pages import tag_page
+from .services import (
+    feed_count_key, get_comments_page, get_feed, get_posts_page,
+)
+from .stats import get_user_stats
+from .thumbnails import generate_later
+from .timeline import get_follow_feed
 
 
+@cached_queries()
+@condition(etag_func=conditions.index_etag)
 def index(request: HttpRequest):
     """Представление главной страницы."""
-    return render(request, 'posts/index.html', {
-        'page_obj': get_posts_page(request, Post.objects.all()),
-    })
+    return tag_page(render(request, 'posts/index.html', {
+        'page_obj': get_posts_page(
+            request, get_feed(), count_key=feed_count_key('index')
+        ),
+    }), 'index')
 
 
+@cached_queries()
+@condition(etag_func=conditions.group_etag)
 def group_posts(request: HttpRequest, slug: str):
     """Представление группы."""
     group = get_object_or_404(Group, slug=slug)
-    return render(request, 'posts/group_list.html', {
+    return tag_page(render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': get_posts_page(request, group.posts.all())
-    })
+        'page_obj': get_posts_page(
+            request, get_feed(group=group),
+            count_key=feed_count_key('group', group.pk)
+        )
+    }), f'group:{group.pk}', 'users', keys=[f'group-{group.slug}', 'users'])
 
 
+@cached_queries()
+@condition(etag_func=conditions.profile_etag)
 def profile(request: HttpRequest, username: str):
     """Представление страницы пользователя."""
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    return render(request, 'posts/profile.html', {
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    # Кнопка подписки заполняется posts.holes.HolePunchMiddleware
+    return tag_page(render(request, 'posts/profile.html', {
         'author': author,
-        'following': (
-            user.is_authenticated and user != author
-            and Follow.objects.filter(user=user, author=author).exists()
-        ),
-        'page_obj': get_posts_page(request, author.posts.all())
-    })
+        'stats': get_user_stats(author),
+        'page_obj': get_posts_page(
+            request, get_feed(author=author),
+            count_key=feed_count_key('author', author.pk)
+        )
+    }), f'author:{author.pk}', 'groups')
 
 
+@cached_queries()
+@condition(etag_func=conditions.post_etag)
 def post_detail(request: HttpRequest, post_id):
     """Представление для одной публикации."""
-    return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, pk=post_id),
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    return tag_page(render(request, 'posts/post_detail.html', {
+        'post': post,
+        'author_stats': get_user_stats(post.author),
+        'comments': get_comments_page(post),
         'form': CommentForm(request.POST)
-    })
+    }), f'post:{post.pk}', f'author:{post.author_id}', 'users', 'groups')
+
+
+@cached_queries()
+@condition(etag_func=conditions.post_etag)
+def post_comments(request: HttpRequest, post_id):
+    """Фрагмент со следующими комментариями публикации."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return tag_page(render(request, 'posts/includes/comment_list.html', {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get('after')),
+    }), f'post:{post.pk}', 'users')
 
 
 @login_required
@@ -55,6 +96,7 @@ def post_create(request: HttpRequest):
     post = form.save(commit=False)
     post.author = request.user  # @login_required
     post.save()
+    generate_later(post)
     return redirect('posts:profile', request.user.username)
 
 
@@ -74,7 +116,7 @@ def post_edit(request: HttpRequest, post_id):
             'form': form,
             'is_edit': True
         })
-    form.save()
+    generate_later(form.save())
     return redirect('posts:post_detail', post.pk)
 
 
@@ -91,13 +133,16 @@ def add_comment(request: HttpRequest, post_id):
 
 
 @login_required
+@condition(etag_func=conditions.follow_etag)
 def follow_index(request: HttpRequest):
-    return render(request, 'posts/follow.html', {
+    feed, keys = get_follow_feed(request.user)
+    # Лента личная: прокси получит Cache-Control: private
+    return tag_page(render(request, 'posts/follow.html', {
         'page_obj': get_posts_page(
-            request,
-            Post.objects.filter(author__following__user=request.user)
+            request, feed, keys,
+            count_key=feed_count_key('follow', request.user.pk)
         )
-    })
+    }), 'index')
 
 
 @login_required
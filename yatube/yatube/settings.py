@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.pages.AnonymousPageCacheMiddleware',
+    'core.purge.PurgeBatchMiddleware',
+    'core.loaders.IdentityMapMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.holes.HolePunchMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -147,12 +152,125 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 # Cache
 
+# Кэш процесса перед общим кэшем (core.cache_backends). Общий кэш —
+# каталог SHARED_CACHE_DIR, один для всех процессов сервера, пула и
+# команд; add и incr в нем атомарны под блокировкой файла. Тесты
+# заменяют его памятью процесса (yatube.test_settings)
+SHARED_CACHE_DIR = os.environ.get(
+    'SHARED_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'yatube_cache')
+)
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'yatube',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 # Application settings
 
 POSTS_PER_PAGE = 10
+
+# Комментариев на странице публикации и в каждой догрузке
+COMMENTS_PER_PAGE = 20
+
+# Режим постраничного вывода лент: 'pages' (номера страниц)
+# или 'keyset' (курсоры after/before по (pub_date, id))
+POSTS_PAGINATION = 'pages'
+
+# Числа публикаций в лентах кэшируются; выше порога считаются приблизительно
+POSTS_COUNT_THRESHOLD = 1000
+
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 60
+
+# Фоновые задачи: при EAGER выполняются сразу в потоке запроса; пулы
+# потоков и процессов
+
+BACKGROUND_TASKS_EAGER = DEBUG
+
+BACKGROUND_TASKS_WORKERS = 4
+
+BACKGROUND_PROCESS_WORKERS = 2
+
+# Прием картинок публикаций (posts.images): ограничения проверяются до
+# декодирования; большие снимки уменьшаются до POST_IMAGE_MAX_SIZE по
+# большей стороне и пережимаются без метаданных
+
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+
+POST_IMAGE_MAX_SIZE = 2048
+
+POST_IMAGE_QUALITY = 85
+
+# Файл картинки без ссылок из публикаций удаляется не раньше, чем через
+# столько секунд после последней загрузки того же содержимого
+
+POST_IMAGE_RELEASE_DELAY = 60 * 60
+
+# Миниатюры картинок публикаций (posts.thumbnails): имя — геометрия и
+# параметры sorl-thumbnail. Строятся после сохранения в пуле процессов
+POST_THUMBNAILS = {
+    'card': ('400x200', {'crop': 'center', 'padding': True, 'upscale': False}),
+    'detail': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Материализованные ленты подписок
+
+TIMELINE_BATCH_SIZE = 500
+
+# Лента подписок: 'join', 'timeline', 'hybrid' или 'merge'
+FOLLOW_FEED = 'hybrid'
+
+# В режиме 'hybrid' публикации авторов с большим числом подписчиков не
+# рассылаются по лентам, а подмешиваются при чтении из кэша последних
+# публикаций автора
+TIMELINE_FANOUT_MAX_FOLLOWERS = 1000
+
+AUTHOR_RECENT_POSTS = 200
+
+AUTHOR_RECENT_POSTS_TIMEOUT = 60 * 60 * 24
+
+# Фрагменты шаблонов хранятся долго: устаревают они сменой поколения
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Обратный прокси: срок хранения страниц и очистка по суррогатным ключам
+PROXY_CACHE_TIMEOUT = 60 * 10
+
+PURGE_BACKEND = 'core.purge.NullPurger'
+
+PURGE_URL = 'http://127.0.0.1:6081/'
+
+PURGE_BATCH_SIZE = 100
+
+PURGE_TIMEOUT = 5
+
+# Защита от одновременной перестройки кэша (core.caching): блокировка,
+# ожидание перестройки, срок отдачи устаревшего значения и коэффициент
+# раннего обновления XFetch
+CACHE_LOCK_TIMEOUT = 30
+
+CACHE_LOCK_WAIT = 2
+
+CACHE_STALE_TIMEOUT = 60 * 5
+
+CACHE_XFETCH_BETA = 1.0
+
+# Срок хранения результатов запросов в кэше (core.querycache)
+QUERY_CACHE_TIMEOUT = 60 * 60
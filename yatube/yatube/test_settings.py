@@ -0,0 +1,16 @@
+"""Настройки тестов.
+
+Общий кэш — память процесса: тесты не видят кэш сервера разработки и
+других запусков тестов.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES
+
+CACHES = {
+    **CACHES,
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}